@@ -0,0 +1,193 @@
+import sqlite3
+from array import array
+
+import numpy as np
+
+# Percentiles reported for every group, besides the median (the 50th).
+PERCENTILES = (25, 75, 90)
+
+# Months are stored as year * 12 + (month - 1), so consecutive months are consecutive ints.
+NO_MONTH = -1
+
+ROWS_SQL = """
+    SELECT amount, category,
+           COALESCE(CAST(SUBSTR(month, 1, 4) AS INTEGER) * 12 + CAST(SUBSTR(month, 6, 2) AS INTEGER) - 1, -1)
+    FROM {table}
+"""
+
+
+def month_ordinal(month) -> int:
+    if not month:
+        return NO_MONTH
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def month_label(ordinal: int) -> str:
+    year, month = divmod(int(ordinal), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+class ExpenseColumns:
+    """
+    Expenses as three parallel arrays instead of one object per row.
+
+    amounts    float64
+    months     int32 month ordinals (NO_MONTH where the timestamp couldn't be parsed)
+    categories int32 codes into category_names
+    """
+
+    def __init__(self, amounts, months, categories, category_names):
+        self.amounts = amounts
+        self.months = months
+        self.categories = categories
+        self.category_names = category_names
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (amount, category, month) tuples, month as "YYYY-MM" or an ordinal."""
+        codes = {}
+        ordinals = {}
+        amounts, months, categories = array("d"), array("i"), array("i")
+        for amount, category, month in rows:
+            amounts.append(amount)
+            code = codes.get(category)
+            if code is None:
+                code = codes[category] = len(codes)
+            categories.append(code)
+            if not isinstance(month, int):
+                ordinal = ordinals.get(month)
+                if ordinal is None:
+                    ordinal = ordinals[month] = month_ordinal(month)
+                month = ordinal
+            months.append(month)
+
+        return cls(
+            np.frombuffer(amounts, dtype=np.float64),
+            np.frombuffer(months, dtype=np.int32),
+            np.frombuffer(categories, dtype=np.int32),
+            list(codes),
+        )
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, where_sql: str = "", params=()):
+        """Load the expenses matching where_sql (see build_where_sql in app.py)."""
+        # Filtered loads use the category/month indexes. For everything, read the
+        # (month, category, amount) index, which has all three columns and
+        # is much narrower than the table rows.
+        table = "expenses" if where_sql else "expenses INDEXED BY idx_expenses_month_category_amount"
+        return cls.from_rows(conn.execute(ROWS_SQL.format(table=table) + where_sql, params))
+
+
+def group_stats(values, codes, n_groups: int, percentiles=PERCENTILES) -> dict:
+    """
+    count, sum, mean, median and percentiles of values for each code in 0..n_groups-1.
+
+    Grouping the values by code and sorting each group's run in place puts every
+    group in one sorted run, so each percentile is an index into that run; the
+    interpolation is the same as np.percentile's default. Empty groups get NaN
+    for everything but count and sum.
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+
+    result = {"count": counts, "sum": sums, "mean": means}
+    if len(values) == 0:
+        for q in (50, *percentiles):
+            result[_percentile_key(q)] = np.full(n_groups, np.nan)
+        return result
+
+    # A stable sort of small ints is a radix sort; sorting the values themselves
+    # (rather than argsorting them) keeps the float sort in cache.
+    if n_groups <= np.iinfo(np.int16).max:
+        codes = codes.astype(np.int16)
+    sorted_values = values[np.argsort(codes, kind="stable")]
+    starts = np.cumsum(counts) - counts
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        sorted_values[start:start + count].sort()
+    empty = counts == 0
+    last = len(sorted_values) - 1
+    for q in (50, *percentiles):
+        position = starts + (counts - 1) * (q / 100)
+        lower = np.clip(np.floor(position).astype(np.int64), 0, last)
+        upper = np.clip(np.ceil(position).astype(np.int64), 0, last)
+        fraction = position - np.floor(position)
+        value = sorted_values[lower] * (1 - fraction) + sorted_values[upper] * fraction
+        value[empty] = np.nan
+        result[_percentile_key(q)] = value
+    return result
+
+
+def _percentile_key(q: int) -> str:
+    return "median" if q == 50 else f"p{q}"
+
+
+def rolling_mean(series, window: int):
+    """Mean of each value and the window - 1 before it; NaN until there are enough."""
+    result = np.full(len(series), np.nan)
+    if len(series) >= window:
+        total = np.cumsum(np.concatenate(([0.0], series)))
+        result[window - 1:] = (total[window:] - total[:-window]) / window
+    return result
+
+
+def by_category(columns: ExpenseColumns) -> list[dict]:
+    """One row per category, biggest total first."""
+    stats = group_stats(columns.amounts, columns.categories, len(columns.category_names))
+    rows = [
+        {"category": name, **row}
+        for name, row in zip(columns.category_names, _rows(stats, len(columns.category_names)))
+    ]
+    return sorted(rows, key=lambda r: r["sum"], reverse=True)
+
+
+def by_month(columns: ExpenseColumns) -> list[dict]:
+    """
+    One row per month from the first to the last, oldest first, with empty months
+    in between as zero so deltas and rolling averages compare calendar neighbours.
+    """
+    has_month = columns.months != NO_MONTH
+    months = columns.months[has_month]
+    if len(months) == 0:
+        return []
+
+    first = months.min()
+    span = int(months.max() - first) + 1
+    stats = group_stats(columns.amounts[has_month], months - first, span)
+
+    sums = stats["sum"]
+    previous = np.concatenate(([np.nan], sums[:-1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats["delta"] = sums - previous
+        stats["delta_pct"] = np.where(previous > 0, stats["delta"] / previous * 100, np.nan)
+    stats["rolling_3"] = rolling_mean(sums, 3)
+    stats["rolling_12"] = rolling_mean(sums, 12)
+
+    return [{"month": month_label(first + i), **row} for i, row in enumerate(_rows(stats, span))]
+
+
+def summarize(columns: ExpenseColumns) -> dict:
+    """Everything the stats views show, as plain JSON-ready values."""
+    return {
+        "count": len(columns),
+        "total": float(columns.amounts.sum()),
+        "by_category": by_category(columns),
+        "by_month": by_month(columns),
+    }
+
+
+def _rows(stats: dict, n: int) -> list[dict]:
+    # NaN isn't valid JSON, so "no value" comes out as None.
+    columns = {key: values.tolist() for key, values in stats.items()}
+    rows = []
+    for i in range(n):
+        rows.append({key: _no_nan(values[i]) for key, values in columns.items()})
+    return rows
+
+
+def _no_nan(value):
+    return None if value != value else value
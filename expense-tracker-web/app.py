@@ -1,40 +1,290 @@
+import click
 import csv
 import io
-from datetime import datetime, date
-from flask import Flask, render_template, request, url_for, redirect, flash, Response
-from flask_login import LoginManager, login_user, login_required
-from models import db, User
-from db import get_conn, init_db
+import json
+import os
+import threading
+from contextlib import closing
+from datetime import datetime, date, timezone
+from functools import wraps
+from flask import Blueprint, Flask, current_app, render_template, request, url_for, redirect, flash, Response, stream_with_context, make_response, session, send_file, abort
+from flask_login import LoginManager, login_user, logout_user, login_required
+from sqlalchemy import event
+from models import db, SessionUser, User
+from auth import AuthBusy, init_auth, verify_password
+from db import DB_PATH, connect, get_conn, get_migrations, get_pool, init_db, init_pool, pool_stats, query_count, release_conn, schema_version
+from rollup import rebuild_rollup, check_rollup
+from cache import DimensionCache, DataVersion, ResultCache
+from validation import clean_expense
+from importer import detect_format, import_file, open_upload
+from search import MATCH_IDS_SQL, RANKED_SQL, match_query
+from instrumentation import init_instrumentation, metrics_snapshot, profiles_snapshot
+from jobs import JobsBusy, get_queue, init_jobs
+from templating import init_templates
 import re
 
 
-app = Flask(__name__)
-app.config["SECRET_KEY"] = "change-me-to-a-long-random-string"
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///expense_tracker.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-db.init_app(app)
+bp = Blueprint("expenses", __name__, cli_group=None)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"  # type: ignore
+login_manager.login_view = "expenses.login"  # type: ignore
+
+def read_data_version() -> tuple:
+    """The (version, changed_at) row the expenses triggers keep (migrations 0005 and 0006)."""
+    return tuple(get_conn().execute("SELECT version, changed_at FROM data_version WHERE id = 1").fetchone())
+
+# Process-wide caches, sized from the config by create_app().
+users = ResultCache()
+dimensions = DimensionCache()
+data_version = DataVersion(read_data_version)
+results = ResultCache()
+fragments = ResultCache()
+
+def create_app(config=None) -> Flask:
+    """
+    Build the app; config (a dict) overrides the defaults below.
+
+    Nothing here opens a database, starts a thread or imports numpy, so it is
+    cheap for tests and CLI commands, and it is safe to call once in a
+    pre-fork server's master (gunicorn --preload "app:create_app()"): pools,
+    executors and connections are made on first use, in each worker. The
+    schema is checked on the first request (see ensure_schema()).
+    """
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "change-me-to-a-long-random-string"
+    # EXPENSES_USERS_DB points the accounts at another database, like EXPENSES_DB does for expenses.
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("EXPENSES_USERS_DB", "sqlite:///expense_tracker.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["PAGE_SIZE"] = 50
+    app.config["MAX_PAGE_SIZE"] = 500
+    app.config["EXPORT_BATCH_SIZE"] = 1000
+    app.config["DB_POOL_SIZE"] = 8
+    app.config["DB_POOL_TIMEOUT"] = 10.0
+    app.config["DB_CACHE_SIZE_KB"] = 16 * 1024
+    app.config["DB_MMAP_SIZE"] = 256 * 1024 * 1024
+    app.config["DB_BUSY_TIMEOUT_MS"] = 5000
+    app.config["DIMENSION_CACHE_TTL"] = 60.0
+    app.config["RESULT_CACHE_SIZE"] = 256
+    app.config["RESULT_CACHE_TTL"] = 60.0
+    # Rendered expense tables and stats lists (templating.py); 0 turns fragment caching off.
+    app.config["FRAGMENT_CACHE_SIZE"] = 128
+    app.config["FRAGMENT_CACHE_TTL"] = 60.0
+    # Compiled templates, shared by every worker and kept across restarts.
+    app.config["TEMPLATE_CACHE_DIR"] = os.environ.get("EXPENSES_TEMPLATE_CACHE", os.path.join(app.instance_path, "jinja"))
+    app.config["EXPORT_CACHE_MAX_BYTES"] = 1024 * 1024
+    app.config["ASGI_THREADS"] = 8  # asgi.py; no more than DB_POOL_SIZE
+    app.config["IMPORT_BATCH_SIZE"] = 10_000
+    # Per-request SQL/template timings, a Server-Timing header and /debug/metrics (instrumentation.py).
+    app.config["INSTRUMENT"] = os.environ.get("EXPENSES_INSTRUMENT") == "1"
+    app.config["INSTRUMENT_PROFILE"] = os.environ.get("EXPENSES_PROFILE") == "1"
+    app.config["INSTRUMENT_PROFILE_INTERVAL_MS"] = 5
+    app.config["INSTRUMENT_SLOW_MS"] = 500
+    # The /debug/* counters need a login and are served only with INSTRUMENT or DEBUG_ENDPOINTS on.
+    app.config["DEBUG_ENDPOINTS"] = os.environ.get("EXPENSES_DEBUG_ENDPOINTS") == "1"
+    # Logged-in users are looked up in memory, not in the users table, on every request.
+    app.config["USER_CACHE_SIZE"] = 1024
+    app.config["USER_CACHE_TTL"] = 300.0
+    # Password hashing (auth.py). Existing hashes are upgraded on login after a change.
+    app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+    app.config["AUTH_WORKERS"] = 2
+    app.config["AUTH_MAX_PENDING"] = 32
+    app.config["AUTH_TIMEOUT"] = 10.0
+    # Exports and reports run as background jobs (jobs.py); results are kept for JOB_KEEP_SECONDS.
+    app.config["JOB_WORKERS"] = 2
+    app.config["JOB_MAX_QUEUED"] = 16
+    app.config["JOB_KEEP_SECONDS"] = 3600
+    app.config["JOB_DIR"] = os.environ.get("EXPENSES_JOB_DIR", os.path.join(app.instance_path, "jobs"))
+    # Apply pending migrations on the first request. Turn off (EXPENSES_AUTO_MIGRATE=0) when
+    # deploys run `flask init-db` once; workers then only check the schema version.
+    app.config["AUTO_MIGRATE"] = os.environ.get("EXPENSES_AUTO_MIGRATE", "1") == "1"
+    app.config.update(config or {})
+
+    db.init_app(app)
+    init_pool(app)
+    init_instrumentation(app)
+    init_auth(app)
+    init_jobs(app)
+    login_manager.init_app(app)
+
+    users.maxsize, users.ttl = app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"]
+    dimensions.ttl = app.config["DIMENSION_CACHE_TTL"]
+    results.maxsize, results.ttl = app.config["RESULT_CACHE_SIZE"], app.config["RESULT_CACHE_TTL"]
+    fragments.maxsize, fragments.ttl = app.config["FRAGMENT_CACHE_SIZE"], app.config["FRAGMENT_CACHE_TTL"]
+    init_templates(app, fragments if app.config["FRAGMENT_CACHE_SIZE"] else None)
+
+    app.register_blueprint(bp)
+    return app
 
 @login_manager.user_loader
 def load_user(user_id: str):
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    db.create_all
+    """The logged-in user for this request, from the in-process cache when it can be."""
+    key = ("user", user_id)
+    user = users.lookup(key)
+    if user is None:
+        generation = users.generation()
+        row = db.session.get(User, int(user_id))
+        if row is None:
+            return None
+        user = row.session_user()
+        users.put(key, user, generation)
+    return user
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def user_changed(mapper, connection, target):
+    users.discard(("user", str(target.id)))
+
+@bp.app_errorhandler(AuthBusy)
+def auth_busy(e):
+    return "Too many logins at once, please try again in a moment.", 503, {"Retry-After": "1"}
+
+@bp.app_errorhandler(JobsBusy)
+def jobs_busy(e):
+    return "Too many exports waiting, please try again in a moment.", 503, {"Retry-After": "5"}
 
 MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
 
-init_db()
+_seen_version = None
+_seen_lock = threading.Lock()
+
+def clear_caches():
+    dimensions.invalidate()
+    results.clear()
+    fragments.clear()
+
+def caches_match(version: int):
+    """
+    Drop this process's cached results if the data changed without it.
+
+    Writes from another worker, the CLI's sqlite ledger or a plain sqlite3
+    session don't call expenses_changed() here, so a data_version other than
+    the last one this process saw means any cached result may be stale.
+    """
+    global _seen_version
+    with _seen_lock:
+        if version != _seen_version:
+            if _seen_version is not None:
+                clear_caches()
+            _seen_version = version
+
+def expenses_changed(touched=None):
+    """
+    Call after any write to expenses: drops the cached dropdowns and results.
+
+    touched lists the (category, month) of the written rows, before and after
+    the change, so only the cached results they appear in are dropped. None
+    (e.g. after an import) drops them all.
+    """
+    global _seen_version
+    dimensions.invalidate()
+    for cache in (results, fragments):
+        if touched is None:
+            cache.clear()
+        else:
+            for category, month in set(touched):
+                cache.invalidate(category, month)
+    # The views only write one row at a time, which moves data_version on by
+    # one. More than that means another process wrote too.
+    version = data_version.read()[0]
+    with _seen_lock:
+        if touched is None or _seen_version is None or version != _seen_version + 1:
+            clear_caches()
+        _seen_version = version
+
+def not_modified(etag: str, last_modified) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    # No Last-Modified while its second is still running; a date in the future is invalid (RFC 9110).
+    if since is None or last_modified is None or since > datetime.now(timezone.utc):
+        return False
+    return last_modified <= since
+
+def conditional(html: bool = True):
+    """
+    ETag/Last-Modified for a read-only view, from data_version.
+
+    A matching If-None-Match (or a fresh enough If-Modified-Since) gets a 304
+    before the view runs, so an unchanged poll costs one primary-key read and
+    no rendering.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, etag, last_modified = data_version.current()
+            caches_match(version)
+            # A page with a flash message waiting has to be rendered, even if the data is the same.
+            fresh = not_modified(etag, last_modified) and not (html and session.get("_flashes"))
+            if fresh:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            # Werkzeug stamps the current time for None, so leave the header off instead.
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def prepare_schema():
+    """
+    Bring the schemas up to date if AUTO_MIGRATE allows it.
+
+    Returns None when the expenses database is current, or a message telling
+    the operator to run `flask init-db` when it is behind and AUTO_MIGRATE
+    is off.
+    """
+    latest = get_migrations()[-1][0]
+    current = schema_version(get_conn())
+    if current < latest:
+        if not current_app.config["AUTO_MIGRATE"]:
+            return f"expenses.db is at schema version {current} of {latest}; run `flask init-db` first"
+        init_db()
+    if current_app.config["AUTO_MIGRATE"]:
+        db.create_all()
+    return None
+
+@bp.before_app_request
+def ensure_schema():
+    """
+    Check the schema version on this process's first request, then never again.
+
+    Migrations are meant to run once per deployment, with `flask init-db`.
+    With AUTO_MIGRATE (the default, for development) a worker that finds the
+    database behind applies them itself (migrate() makes sure only one process
+    applies each step); without it, the worker refuses to serve an old schema.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        problem = prepare_schema()
+        if problem:
+            raise RuntimeError(problem)
+        _schema_ready = True
+
+def needs_schema(command):
+    """For CLI commands that use the expenses tables: the same check as the first request."""
+    @wraps(command)
+    def wrapper(*args, **kwargs):
+        problem = prepare_schema()
+        if problem:
+            raise click.ClickException(problem)
+        return command(*args, **kwargs)
+    return wrapper
 
 def get_months(conn):
     rows = conn.execute(
         """
-        SELECT DISTINCT SUBSTR(created_at, 1, 7) AS month
-        FROM expenses
+        SELECT DISTINCT month
+        FROM expense_rollup
         ORDER BY month DESC
         """
     ).fetchall()
@@ -56,36 +306,56 @@ def last_n_months(n: int = 12) -> list[str]:
             y -= 1
     return months
 
-def describe_filters(category: str, month: str) -> str:
-    if not category and not month:
+def describe_filters(category: str, month: str, q: str = "") -> str:
+    if not category and not month and not q:
         return "No filters (showing all expenses)."
     parts = []
     if category:
         parts.append(f"Category: {category}")
     if month:
         parts.append(f"Month: {month}")
+    if q:
+        parts.append(f"Search: {q} (best matches first)")
     return "Active filters: " + " • ".join(parts)
 
 
 def get_categories(conn):
-    return conn.execute(
-        "SELECT DISTINCT category FROM expenses ORDER BY category"
+    rows = conn.execute(
+        "SELECT DISTINCT category FROM expense_rollup ORDER BY category"
     ).fetchall()
+    return [r["category"] for r in rows]
+
+def load_dimensions():
+    with get_conn() as conn:
+        return get_categories(conn), get_months(conn)
+
+def get_dimensions():
+    """(categories, months) for the filter dropdowns, served from the in-process cache."""
+    return dimensions.get(load_dimensions)
 
 def get_filters():
-    """Read filters from the URL query string (GET params)."""
-    category = request.args.get("category", "").strip()
-    month = request.args.get("month", "").strip()
+    """Read filters from the URL query string (GET params), or the form for the job POSTs."""
+    category = request.values.get("category", "").strip()
+    month = request.values.get("month", "").strip()
+    q = request.values.get("q", "").strip()
     
     if month and not MONTH_RE.match(month):
         month = ""
+
+    # Punctuation on its own has nothing to search for.
+    if not match_query(q):
+        q = ""
     
-    return category, month
+    return category, month, q
 
-def build_where_sql(category: str, month: str):
+def build_where_sql(category: str, month: str, q: str = ""):
     """
     Build a safe SQL WHERE clause +parameters list based on filters.
 
+    Both expenses and expense_rollup have category and month columns, so the
+    same clause works against either table. A search (q) goes through the
+    expenses_fts index and only works against expenses.
+
     Returns:
         where_sql (str): "" or " WHERE ... AND ..."
         params (list): values matching the ? placeholders 
@@ -98,8 +368,12 @@ def build_where_sql(category: str, month: str):
         params.append(category)
 
     if month:
-        conditions.append("created_at LIKE ?")
-        params.append(f"{month}%")
+        conditions.append("month = ?")
+        params.append(month)
+
+    if q:
+        conditions.append(MATCH_IDS_SQL)
+        params.append(match_query(q))
     
     where_sql = ""
     if conditions:
@@ -107,35 +381,183 @@ def build_where_sql(category: str, month: str):
 
     return where_sql, params
 
-app.route("/login", methods=["GET", "POST"])
+def get_page_size() -> int:
+    """Read ?per_page= from the query string, falling back to the configured page size."""
+    try:
+        size = int(request.args.get("per_page", current_app.config["PAGE_SIZE"]))
+    except ValueError:
+        size = current_app.config["PAGE_SIZE"]
+    return max(1, min(size, current_app.config["MAX_PAGE_SIZE"]))
+
+def encode_cursor(row) -> str:
+    # Search results are in bm25 order, so their cursors carry the rank instead of the date.
+    if "rank" in row.keys():
+        return f"{row['rank']!r},{row['id']}"
+    return f"{row['created_at']},{row['id']}"
+
+def decode_cursor(raw: str, ranked: bool = False):
+    """Turn "created_at,id" (or "rank,id" for a search) back into a tuple, or None if it is missing/invalid."""
+    if not raw:
+        return None
+    position, _, expense_id = raw.rpartition(",")
+    if not position or not expense_id.isdigit():
+        return None
+    if ranked:
+        try:
+            position = float(position)
+        except ValueError:
+            return None
+    return position, int(expense_id)
+
+def build_page_sql(where_sql: str, params: list, page_size: int, after=None, before=None):
+    """Build the keyset-paginated SELECT used by fetch_expense_page()."""
+    conditions = [where_sql[len(" WHERE "):]] if where_sql else []
+    params = list(params)
+
+    if before:
+        # Walking back towards newer rows: read ascending, then flip.
+        conditions.append("(created_at, id) > (?, ?)")
+        params.extend(before)
+        order_sql = " ORDER BY created_at ASC, id ASC"
+    else:
+        if after:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        order_sql = " ORDER BY created_at DESC, id DESC"
+
+    sql = "SELECT * FROM expenses"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += order_sql + " LIMIT ?"
+    params.append(page_size + 1)
+    return sql, params
+
+def build_search_page_sql(where_sql: str, params: list, match: str, page_size: int, after=None, before=None):
+    """Like build_page_sql(), but for a search: best bm25 rank first, ties newest first."""
+    conditions = [where_sql[len(" WHERE "):]] if where_sql else []
+    params = [match, *params]
+
+    if before:
+        # Walking back towards better matches: read in reverse, then flip.
+        conditions.append("(rank < ? OR (rank = ? AND id > ?))")
+        params.extend((before[0], before[0], before[1]))
+        order_sql = " ORDER BY rank DESC, id ASC"
+    else:
+        if after:
+            conditions.append("(rank > ? OR (rank = ? AND id < ?))")
+            params.extend((after[0], after[0], after[1]))
+        order_sql = " ORDER BY rank ASC, id DESC"
+
+    sql = RANKED_SQL
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += order_sql + " LIMIT ?"
+    params.append(page_size + 1)
+    return sql, params
+
+def fetch_expense_page(conn, where_sql: str, params: list, page_size: int, after=None, before=None, q: str = ""):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Rows are fetched straight off idx_expenses_created_at (the index carries the
+    rowid, so no sort is needed) and only page_size + 1 rows are read, which keeps
+    the cost of a page the same however big the table gets.
+
+    With a search (q), the pages go over (rank, id) instead: FTS5 finds the
+    matches from its index and only those are ranked, never the whole table.
+
+    Returns:
+        rows (list): the expenses on this page, newest first
+        prev_cursor (str | None): cursor for the newer page, if there is one
+        next_cursor (str | None): cursor for the older page, if there is one
+    """
+    if q:
+        sql, params = build_search_page_sql(where_sql, params, match_query(q), page_size, after=after, before=before)
+    else:
+        sql, params = build_page_sql(where_sql, params, page_size, after=after, before=before)
+    rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if before:
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    prev_cursor = encode_cursor(rows[0]) if rows and has_newer else None
+    next_cursor = encode_cursor(rows[-1]) if rows and has_older else None
+    return rows, prev_cursor, next_cursor
+
+def get_expense_page(category: str, month: str, page_size: int, after=None, before=None, q: str = ""):
+    """
+    One page plus the filtered total, for the index page and /api/expenses.
+
+    Served from the result cache; a write only evicts the pages for its own
+    category and month (and the unfiltered ones). Search results are a subset
+    of those, so the same eviction covers them.
+
+    Returns:
+        (rows, prev_cursor, next_cursor, total)
+    """
+    def load():
+        where_sql, params = build_where_sql(category, month)
+        with get_conn() as conn:
+            rows, prev_cursor, next_cursor = fetch_expense_page(
+                conn, where_sql, params, page_size, after=after, before=before, q=q
+            )
+
+            if q:
+                # The rollup has no descriptions; add up the matching expenses themselves.
+                search_sql, search_params = build_where_sql(category, month, q)
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(amount), 0) AS total FROM expenses" + search_sql,
+                    search_params
+                ).fetchone()["total"]
+            else:
+                # Index-only aggregate over the rollup rather than a second pass over expenses.
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(total), 0) AS total FROM expense_rollup" + where_sql,
+                    params
+                ).fetchone()["total"]
+        return rows, prev_cursor, next_cursor, total
+
+    return results.get(("expense_page", category, month, q, page_size, after, before), load)
+
+@bp.route("/login", methods=["GET", "POST"])
 def login():
-    if request.method == "Post":
+    if request.method == "POST":
         email = request.form.get("email", "").strip().lower()
         password = request.form.get("password", "")
 
         user = User.query.filter_by(email=email).first()
-        if not user or not user.check_password(password):
+        # Unknown emails still cost one hash check, so they can't be told apart by timing.
+        ok = user.check_password(password) if user else verify_password(None, password)[0]
+        if not ok:
             flash("Invalid email or password.")
-            return redirect(url_for("login"))
+            return redirect(url_for("expenses.login"))
+
+        if db.session.is_modified(user):
+            db.session.commit()  # the hash was upgraded to the current settings
         
-        login_user(user)
-        return redirect(url_for("index"))
+        login_user(user.session_user())
+        return redirect(url_for("expenses.index"))
     
     return render_template("login.html")
 
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
     flash("Logged out.")
-    return redirect(url_for("login"))
+    return redirect(url_for("expenses.login"))
 
 
 
 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
         email = request.form.get("email", "").strip().lower()
@@ -143,12 +565,12 @@ def register():
 
         if not email or not password:
             flash("Email and password are required.")
-            return redirect(url_for("register"))
+            return redirect(url_for("expenses.register"))
         
-        existing = User.query.filter_by(email=email).first
+        existing = User.query.filter_by(email=email).first()
         if existing:
             flash("That email is already registered.")
-            return redirect(url_for("register"))
+            return redirect(url_for("expenses.register"))
         
         user = User(email=email)
         user.set_password(password)
@@ -157,34 +579,23 @@ def register():
         db.session.commit()
 
         flash("Account created. Please log in.")
-        return redirect(url_for("login"))
+        return redirect(url_for("expenses.login"))
     
     return render_template("register.html")
 
 
-@app.route("/")
+@bp.get("/")
 @login_required
-@app.get("/")
+@conditional()
 def index():
-    category, month = get_filters()
-    where_sql, params = build_where_sql(category, month)
-
-    base_sql = "SELECT * FROM expenses" + where_sql + " ORDER BY created_at DESC"
-
-    with get_conn() as conn:
-        expenses = conn.execute(base_sql, params).fetchall()
-
-        total = conn.execute(
-            "SELECT COALESCE(SUM(amount), 0) AS total FROM (" + base_sql + ") AS filtered",
-            params
-        ).fetchone()["total"]
-
-        categories = conn.execute(
-                "SELECT DISTINCT category FROM expenses ORDER BY category"
-        ).fetchall()
-
-        months = get_months(conn)
+    fragment_generation = fragments.generation()
+    category, month, q = get_filters()
+    page_size = get_page_size()
+    after = decode_cursor(request.args.get("after", ""), ranked=bool(q))
+    before = decode_cursor(request.args.get("before", ""), ranked=bool(q))
 
+    expenses, prev_cursor, next_cursor, total = get_expense_page(category, month, page_size, after, before, q)
+    categories, months = get_dimensions()
 
     return render_template(
         "index.html",
@@ -194,24 +605,49 @@ def index():
         selected_category=category,
         selected_month=month,
         months=months,
-        filters_text=describe_filters(category, month),
+        search=q,
+        filters_text=describe_filters(category, month, q),
+        per_page=page_size,
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor,
+        # Same filters and page as the rows' result-cache entry, so the same writes drop both.
+        rows_key=("index_rows", category, month, q, page_size, after, before),
+        fragment_generation=fragment_generation,
     )
 
-@app.route("/")
+@bp.get("/stats")
 @login_required
-@app.get("/stats")
+@conditional()
 def stats():
-    category, month = get_filters()
-    where_sql, params = build_where_sql(category, month)
+    fragment_generation = fragments.generation()
+    category, month, q = get_filters()
+    by_category, by_month = results.get(("stats", category, month, q), lambda: load_stats(category, month, q))
+    categories, months = get_dimensions()
 
-    with get_conn() as conn:
-        categories = get_categories(conn)
-        months = get_months(conn)
+    return render_template(
+        "stats.html",
+        categories=categories,
+        by_category=by_category,
+        by_month=by_month,
+        selected_category=category,
+        selected_month=month,
+        months=months,
+        search=q,
+        filters_text=describe_filters(category, month, q),
+        totals_key=("stats_totals", category, month, q),
+        fragment_generation=fragment_generation,
+    )
+
+def load_stats(category: str, month: str, q: str = ""):
+    where_sql, params = build_where_sql(category, month, q)
+    # The rollup has no descriptions, so a search adds up the matching expenses instead.
+    source, amount = ("expenses", "amount") if q else ("expense_rollup", "total")
 
+    with get_conn() as conn:
         by_category = conn.execute(
-            """
-            SELECT category, COALESCE(SUM(amount), 0) AS total
-            FROM expenses
+            f"""
+            SELECT category, COALESCE(SUM({amount}), 0) AS total
+            FROM {source}
             """ + where_sql + """
             GROUP BY category
             ORDER BY total DESC
@@ -220,9 +656,9 @@ def stats():
         ).fetchall()
 
         by_month = conn.execute(
-            """
-            SELECT SUBSTR(created_at, 1, 7) AS month, COALESCE(SUM(amount), 0) AS total
-            FROM expenses
+            f"""
+            SELECT month, COALESCE(SUM({amount}), 0) AS total
+            FROM {source}
             """ + where_sql + """
             GROUP BY month
             ORDER BY month DESC
@@ -230,24 +666,60 @@ def stats():
             params,
         ).fetchall()
 
-    return render_template(
-        "stats.html",
-        categories=categories,
-        by_category=by_category,
-        by_month=by_month,
-        selected_category=category,
-        selected_month=month,
-        months=months,
-        filters_text=describe_filters(category, month),
-    )
+    return by_category, by_month
+
+@bp.get("/api/expenses")
+@login_required
+@conditional(html=False)
+def api_expenses():
+    """One page of expenses as JSON: same filters and ?per_page/after/before cursors as the index page."""
+    category, month, q = get_filters()
+    page_size = get_page_size()
+    after = decode_cursor(request.args.get("after", ""), ranked=bool(q))
+    before = decode_cursor(request.args.get("before", ""), ranked=bool(q))
+
+    expenses, prev_cursor, next_cursor, total = get_expense_page(category, month, page_size, after, before, q)
+
+    return {
+        "filters": {"category": category, "month": month, "q": q},
+        "expenses": [dict(row) for row in expenses],
+        "total": total,
+        "per_page": page_size,
+        "prev_cursor": prev_cursor,
+        "next_cursor": next_cursor,
+    }
+
+@bp.get("/api/stats")
+@login_required
+@conditional(html=False)
+def api_stats():
+    """
+    Per-category and per-month statistics for the current filters, as JSON.
+
+    On top of the stats page's totals: counts, means, medians, percentiles,
+    month-over-month changes and rolling 3/12-month averages (see analytics.py).
+    """
+    from analytics import ExpenseColumns, summarize  # numpy, imported on first use
+
+    category, month, q = get_filters()
 
+    def load():
+        where_sql, params = build_where_sql(category, month, q)
+        with get_conn() as conn:
+            return summarize(ExpenseColumns.from_db(conn, where_sql, params))
 
-@app.get("/add")
+    summary = results.get(("api_stats", category, month, q), load)
+    return {"filters": {"category": category, "month": month, "q": q}, **summary}
+
+
+@bp.get("/add")
+@login_required
 def add_page():
     return render_template("add.html")
 
 
-@app.get("/edit/<int:expense_id>")
+@bp.get("/edit/<int:expense_id>")
+@login_required
 def edit_page(expense_id: int):
     with get_conn() as conn:
         exp = conn.execute(
@@ -257,69 +729,224 @@ def edit_page(expense_id: int):
 
     if exp is None:
         flash("Expense not found.")
-        return redirect(url_for("index"))
+        return redirect(url_for("expenses.index"))
     
     return render_template("edit.html", exp=exp)
 
-@app.get("/export.csv")
-def export_csv():
-    category, month = get_filters()
-    where_sql, params = build_where_sql(category, month)
-
-    sql = "SELECT id, created_at, category, description, amount FROM expenses" + where_sql + " ORDER BY created_at DESC"
-
-    with get_conn() as conn:
-        rows = conn.execute(sql, params).fetchall()
-
-    # CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
+EXPORT_COLUMNS = ["id", "created_at", "category", "description", "amount"]
 
-    # Header row
-    writer.writerow(["id", "created_at", "category", "description", "amount"])
+def iter_csv(sql: str, params: list, batch_size: int):
+    """
+    Yield the export as CSV text, one chunk per batch of rows.
 
-    # Data rows
-    for r in rows:
-        writer.writerow([r["id"], r["created_at"], r["category"], r["description"], r["amount"]])
+    Only batch_size rows and one chunk of text are held at a time, so memory stays
+    flat no matter how many rows are exported. The header goes out first so the
+    client gets its first byte before the query has done any real work.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield flush()
+
+    # The pooled connection is released when the streamed response finishes.
+    cur = get_conn().execute(sql, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        writer.writerows(
+            (r["id"], r["created_at"], r["category"], r["description"], r["amount"])
+            for r in rows
+        )
+        yield flush()
 
-    csv_text = output.getvalue()
-    output.close()
+def remember_csv(key: tuple, chunks, max_bytes: int):
+    """
+    Pass the export through unchanged, keeping a copy for the result cache.
 
+    Only exports up to max_bytes are kept; bigger ones just stream, so the
+    cache never costs the memory that streaming saves.
+    """
+    generation = results.generation()
+    kept, size = [], 0
+    for chunk in chunks:
+        yield chunk
+        if kept is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                kept.append(chunk)
+            else:
+                kept = None
+    if kept is not None:
+        results.put(key, kept, generation)
+
+def export_filename(name: str, category: str, month: str, q: str, extension: str) -> str:
     # professional file name w/ filters and timestamp
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    parts = ["expenses"]
+    parts = [name]
     if category:
         parts.append(f"category-{category}")
     if month:
         parts.append(f"month-{month}")
-    filename = "_".join(parts) + f"_{ts}.csv"
+    if q:
+        parts.append("search")
+    return "_".join(parts) + f"_{ts}.{extension}"
+
+@bp.get("/export.csv")
+@login_required
+def export_csv():
+    category, month, q = get_filters()
+    where_sql, params = build_where_sql(category, month, q)
+
+    sql = "SELECT " + ", ".join(EXPORT_COLUMNS) + " FROM expenses" + where_sql + " ORDER BY created_at DESC"
+    filename = export_filename("expenses", category, month, q, "csv")
+
+    caches_match(data_version.current()[0])
+    key = ("export_csv", category, month, q)
+    chunks = results.lookup(key)
+    if chunks is None:
+        chunks = remember_csv(key, iter_csv(sql, params, current_app.config["EXPORT_BATCH_SIZE"]),
+                              current_app.config["EXPORT_CACHE_MAX_BYTES"])
 
     return Response(
-        csv_text,
+        stream_with_context(chunks),
         mimetype="text/csv",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
-@app.route("/")
+def count_expenses(conn, category: str, month: str, q: str) -> int:
+    """How many expenses match the filters (from the rollup unless searching)."""
+    if q:
+        where_sql, params = build_where_sql(category, month, q)
+        return conn.execute("SELECT COUNT(*) FROM expenses" + where_sql, params).fetchone()[0]
+    where_sql, params = build_where_sql(category, month)
+    return conn.execute("SELECT COALESCE(SUM(count), 0) FROM expense_rollup" + where_sql, params).fetchone()[0]
+
+def write_export(job, file, category: str, month: str, q: str):
+    """The /export.csv rows written to a job's file, counting them off as they go."""
+    where_sql, params = build_where_sql(category, month, q)
+    sql = "SELECT " + ", ".join(EXPORT_COLUMNS) + " FROM expenses" + where_sql + " ORDER BY created_at DESC"
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_COLUMNS)
+
+    conn = get_conn()
+    # One read transaction, so the count and the rows agree.
+    conn.execute("BEGIN")
+    try:
+        job.total = count_expenses(conn, category, month, q)
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(current_app.config["EXPORT_BATCH_SIZE"])
+            if not rows:
+                break
+            writer.writerows(
+                (r["id"], r["created_at"], r["category"], r["description"], r["amount"])
+                for r in rows
+            )
+            job.done += len(rows)
+    finally:
+        conn.rollback()
+
+def write_report(job, file, category: str, month: str, q: str):
+    """The /api/stats summary written to a job's file."""
+    from analytics import ExpenseColumns, summarize
+
+    where_sql, params = build_where_sql(category, month, q)
+    conn = get_conn()
+    job.total = count_expenses(conn, category, month, q)
+    columns = ExpenseColumns.from_db(conn, where_sql, params)
+    job.done = len(columns)
+    summary = summarize(columns)
+    json.dump({"filters": {"category": category, "month": month, "q": q}, **summary}, file)
+
+def start_job(kind: str, write, filename: str, mimetype: str):
+    """
+    Queue write(job, file, category, month, q) for the current filters and answer at once.
+
+    The key includes the data version, so a request after a write gets a new
+    job rather than joining one that may have read the data before it.
+    """
+    category, month, q = get_filters()
+    key = (category, month, q, data_version.current()[0])
+    app = current_app._get_current_object()
+
+    def run(job, file):
+        # On a job thread: get_conn() and the config need the app's context.
+        with app.app_context():
+            write(job, file, category, month, q)
+
+    job = get_queue().submit(kind, key, filename, mimetype, run)
+    # Browsers go to a page that follows the job; API clients get its status.
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html":
+        return redirect(url_for("expenses.job_page", job_id=job.id))
+    return job_status(job), 202, {"Location": url_for("expenses.job_detail", job_id=job.id)}
+
+def job_status(job) -> dict:
+    status = job.to_dict()
+    status["status_url"] = url_for("expenses.job_detail", job_id=job.id)
+    if job.finished_ok:
+        status["download_url"] = url_for("expenses.job_download", job_id=job.id)
+    return status
+
+def find_job(job_id: str):
+    job = get_queue().get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+@bp.post("/export")
 @login_required
-@app.post("/add")
-def add_expense():
-    amount_raw = request.form.get("amount", "").strip()
-    category = request.form.get("category", "").strip()
-    description = request.form.get("description", "").strip()
+def start_export():
+    """Export the filtered expenses as CSV in the background (see jobs.py)."""
+    category, month, q = get_filters()
+    return start_job("export", write_export, export_filename("expenses", category, month, q, "csv"), "text/csv")
+
+@bp.post("/report")
+@login_required
+def start_report():
+    """Work out the /api/stats report for the filters in the background, as a JSON file."""
+    category, month, q = get_filters()
+    return start_job("report", write_report, export_filename("report", category, month, q, "json"),
+                     "application/json")
+
+@bp.get("/jobs/<job_id>")
+@login_required
+def job_detail(job_id: str):
+    return job_status(find_job(job_id))
 
+@bp.get("/jobs/<job_id>/view")
+@login_required
+def job_page(job_id: str):
+    return render_template("job.html", job=find_job(job_id))
+
+@bp.get("/jobs/<job_id>/download")
+@login_required
+def job_download(job_id: str):
+    job = find_job(job_id)
+    if not job.finished_ok:
+        return job_status(job), 409
+    return send_file(job.path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+
+@bp.post("/add")
+@login_required
+def add_expense():
     try:
-        amount = float(amount_raw)
-        if amount < 0:
-            raise ValueError
-    except ValueError:
-        flash("Amount must be a number ≥ 0.")
-        return redirect(url_for("add_page"))
-   
-    if not category or not description:
-        flash("Category and description are required.")
-        return redirect(url_for("add_page"))
+        amount, category, description = clean_expense(
+            request.form.get("amount", ""),
+            request.form.get("category", ""),
+            request.form.get("description", ""),
+        )
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for("expenses.add_page"))
     
     created_at = datetime.now().isoformat(timespec="seconds")
 
@@ -329,46 +956,46 @@ def add_expense():
             (amount, category, description, created_at),
         )
         conn.commit()
+    expenses_changed([(category, created_at[:7])])
 
     flash("Expense added.")
-    return redirect(url_for("index"))
+    return redirect(url_for("expenses.index"))
 
-@app.route("/")
+@bp.post("/delete/<int:expense_id>")
 @login_required
-@app.post("/delete/<int:expense_id>")
 def delete_expense(expense_id: int):
     with get_conn() as conn:
-        cur = conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+        deleted = conn.execute(
+            "DELETE FROM expenses WHERE id = ? RETURNING category, month", (expense_id,)
+        ).fetchone()
         conn.commit()
 
-    if cur.rowcount == 0:
+    if deleted is None:
         flash("Expense not found.")
     else:
+        expenses_changed([(deleted["category"], deleted["month"])])
         flash("Expense deleted.")
     
-    return redirect(url_for("index"))
+    return redirect(url_for("expenses.index"))
 
-@app.route("/")
+@bp.post("/edit/<int:expense_id>")
 @login_required
-@app.post("/edit/<int:expense_id>")
 def edit_expense(expense_id: int):
-    amount_raw = request.form.get("amount", "").strip()
-    category = request.form.get("category", "").strip()
-    description = request.form.get("description", "").strip()
-
     try:
-        amount = float(amount_raw)
-        if amount < 0:
-            raise ValueError
-    except ValueError:
-        flash("Amount must be a number ≥ 0.")
-        return redirect(url_for("edit_page", expense_id=expense_id))
-    
-    if not category or not description:
-        flash("Category and description required.")
-        return redirect(url_for("edit_page", expense_id=expense_id))
+        amount, category, description = clean_expense(
+            request.form.get("amount", ""),
+            request.form.get("category", ""),
+            request.form.get("description", ""),
+        )
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for("expenses.edit_page", expense_id=expense_id))
     
     with get_conn() as conn:
+        # The old category is needed to evict the cached results the row is leaving.
+        old = conn.execute(
+            "SELECT category, month FROM expenses WHERE id = ?", (expense_id,)
+        ).fetchone()
         cur = conn.execute(
             "UPDATE expenses SET amount = ?, category = ?, description = ? WHERE id = ?",
             (amount, category, description, expense_id),
@@ -378,9 +1005,181 @@ def edit_expense(expense_id: int):
     if cur.rowcount == 0:
         flash("Expense not found.")
     else:
+        expenses_changed([(old["category"], old["month"]), (category, old["month"])])
         flash("Expense updated.")
 
-    return redirect(url_for("index"))
+    return redirect(url_for("expenses.index"))
+
+@bp.get("/import")
+@login_required
+def import_page():
+    return render_template("import.html", report=None)
+
+@bp.post("/import")
+@login_required
+def import_expenses():
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        flash("Choose a CSV or JSON file to import.")
+        return redirect(url_for("expenses.import_page"))
+
+    fmt = request.form.get("format") or detect_format(upload.filename)
+    with get_conn() as conn:
+        report = import_file(conn, open_upload(upload.stream), fmt, current_app.config["IMPORT_BATCH_SIZE"])
+    if report.inserted:
+        expenses_changed()
+
+    if request.accept_mimetypes.best == "application/json":
+        return report.to_dict()
+    return render_template("import.html", report=report)
+
+@bp.after_app_request
+def add_query_count(response):
+    # Statements this request ran (streamed bodies are still running when this is set).
+    response.headers["X-Query-Count"] = str(query_count())
+    return response
+
+def debug_endpoint(view):
+    """Hide a /debug/* view (404) unless INSTRUMENT or DEBUG_ENDPOINTS is on, and require a login."""
+    protected = login_required(view)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not (current_app.config["INSTRUMENT"] or current_app.config["DEBUG_ENDPOINTS"]):
+            abort(404)
+        return protected(*args, **kwargs)
+    return wrapper
+
+@bp.get("/debug/pool")
+@debug_endpoint
+def debug_pool():
+    """Connection pool counters, for sizing DB_POOL_SIZE against the WSGI worker threads."""
+    return pool_stats()
+
+@bp.get("/debug/cache")
+@debug_endpoint
+def debug_cache():
+    """Result cache counters, for tuning RESULT_CACHE_SIZE and RESULT_CACHE_TTL."""
+    return results.stats()
+
+@bp.get("/debug/jobs")
+@debug_endpoint
+def debug_jobs():
+    """Background jobs by status, for sizing JOB_WORKERS."""
+    return get_queue().stats()
+
+@bp.get("/debug/metrics")
+@debug_endpoint
+def debug_metrics():
+    """Latency histograms per route, SQL statement, pool checkout and template (EXPENSES_INSTRUMENT=1)."""
+    return metrics_snapshot(current_app._get_current_object())
+
+@bp.get("/debug/profiles")
+@debug_endpoint
+def debug_profiles():
+    """Sampled stacks of the latest requests slower than INSTRUMENT_SLOW_MS (EXPENSES_PROFILE=1)."""
+    return profiles_snapshot(current_app._get_current_object())
+
+@bp.cli.command("rebuild-rollup")
+@needs_schema
+@click.option("--check", is_flag=True, help="Only compare the rollup with the expenses table.")
+def rebuild_rollup_command(check: bool):
+    """Backfill expense_rollup from expenses, or check that it is consistent."""
+    with get_conn() as conn:
+        if not check:
+            groups = rebuild_rollup(conn)
+            click.echo(f"Rebuilt expense_rollup: {groups} (month, category) groups.")
+            return
+
+        mismatches = check_rollup(conn)
+
+    if not mismatches:
+        click.echo("expense_rollup is consistent with expenses.")
+        return
+
+    for month, category, stored_total, actual_total, stored_count, actual_count in mismatches:
+        click.echo(
+            f"{month} {category}: rollup £{stored_total:.2f} ({stored_count}) "
+            f"vs actual £{actual_total:.2f} ({actual_count})"
+        )
+    raise SystemExit(1)
+
+@bp.cli.command("import-expenses")
+@needs_schema
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json"]), help="Defaults to the file extension.")
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction.")
+def import_expenses_command(path: str, fmt: str, batch_size: int):
+    """Bulk-load a CSV export or a CLI tracker expenses.json file."""
+    fmt = fmt or detect_format(path)
+    with open(path, encoding="utf-8-sig", newline="") as stream, get_conn() as conn:
+        report = import_file(conn, stream, fmt, batch_size or current_app.config["IMPORT_BATCH_SIZE"])
+
+    click.echo(f"Inserted {report.inserted} rows, skipped {report.failed}.")
+    for reason, count in report.errors_by_reason.most_common():
+        click.echo(f"  {count} x {reason}")
+    for row_number, reason in report.error_samples[:10]:
+        click.echo(f"  row {row_number}: {reason}")
+    if report.aborted:
+        click.echo(f"Stopped early: {report.aborted}")
+        raise SystemExit(1)
+
+@bp.cli.command("write-snapshot")
+@needs_schema
+@click.argument("path", type=click.Path(dir_okay=False), default=str(DB_PATH.with_suffix(".snapshot")))
+def write_snapshot_command(path: str):
+    """Write the expenses to a memory-mappable snapshot file (see snapshot.py)."""
+    from snapshot import db_stamp, set_stamp, write_from_db
+
+    # The stamp has to be taken once every connection is closed: closing the
+    # last one checkpoints the WAL. That includes the pooled one needs_schema used.
+    release_conn()
+    get_pool().close()
+    with closing(connect()) as conn:
+        rows = write_from_db(conn, path)
+    set_stamp(path, db_stamp(DB_PATH))
+    click.echo(f"Wrote {rows} expenses to {path}.")
+
+@bp.cli.command("init-db")
+def init_db_command():
+    """Apply any pending schema migrations."""
+    applied = init_db()
+    db.create_all()
+    if applied:
+        click.echo("Applied migrations: " + ", ".join(str(v) for v in applied))
+    else:
+        click.echo("Database schema is up to date.")
+
+@bp.cli.command("check-query-plans")
+@needs_schema
+def check_query_plans_command():
+    """
+    Run the hot routes for every kind of filter and EXPLAIN each SELECT they issue.
+
+    Fails (exit code 1) if any of them has to scan the expenses table. The
+    same check runs in tests/test_query_plans.py.
+    """
+    from query_plans import hot_queries, plan_problems
+
+    # Expenses aren't kept per user, so a stand-in login sees what anyone would.
+    queries = hot_queries(SessionUser(id=0, email="check-query-plans"))
+    if not queries:
+        click.echo("No expenses yet; add some data first so the planner has something to plan.")
+        return
+
+    failed = False
+    with get_conn() as conn:
+        for sql in queries:
+            problems = plan_problems(conn, sql)
+            if problems:
+                failed = True
+                click.echo("FULL SCAN: " + " ".join(sql.split()))
+                for detail in problems:
+                    click.echo("    " + detail)
+
+    if failed:
+        raise SystemExit(1)
+    click.echo(f"All {len(queries)} hot queries use an index.")
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
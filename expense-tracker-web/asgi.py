@@ -0,0 +1,141 @@
+"""
+ASGI entry point: the same Flask app, routes and templates, under an ASGI server.
+
+    uvicorn asgi:application
+
+Each request runs on a bounded thread pool (ASGI_THREADS), so SQLite calls and
+template rendering never block the event loop. Response bodies are pulled
+from the app one chunk at a time and handed back to the loop between
+chunks. A long /export.csv therefore only holds a thread while a batch is
+being fetched, not while a slow client downloads it, and stops early if the
+client goes away.
+
+At most ASGI_THREADS requests are in progress at once; the rest wait on the
+event loop, which costs a coroutine rather than a thread each. A request in
+progress can hold a pooled connection between chunks, so keep ASGI_THREADS at
+or below DB_POOL_SIZE or streamed exports can time out waiting for one.
+"""
+import asyncio
+import contextvars
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+
+# Request bodies (uploads to /import) bigger than this are spooled to disk.
+MAX_BODY_IN_MEMORY = 1024 * 1024
+
+
+class WsgiToAsgi:
+    def __init__(self, wsgi_app, max_threads: int):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="wsgi")
+        self.slots = asyncio.Semaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=MAX_BODY_IN_MEMORY)
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.write(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body.seek(0)
+
+        async with self.slots:
+            await self.respond(scope, body, receive, send)
+
+    async def respond(self, scope, body, receive, send):
+        # Once the body is read, the only thing left to receive is a disconnect.
+        disconnected = asyncio.ensure_future(receive())
+
+        loop = asyncio.get_running_loop()
+        # Flask keeps the request and app context in context variables. Every step
+        # of this request runs inside one copied context, on whichever pool
+        # thread is free, so the context follows the request from thread to thread.
+        context = contextvars.copy_context()
+
+        def run(fn, *args):
+            return loop.run_in_executor(self.executor, context.run, fn, *args)
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+
+        result = await run(self.wsgi_app, build_environ(scope, body), start_response)
+        try:
+            chunks = iter(result)
+            chunk = await run(next, chunks, None)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            while chunk is not None and not disconnected.done():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await run(next, chunks, None)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            # close() ends the request, which hands the pooled connection back.
+            if hasattr(result, "close"):
+                await run(result.close)
+            disconnected.cancel()
+            body.close()
+
+
+def build_environ(scope, body) -> dict:
+    """The WSGI environ for an ASGI http scope (PEP 3333 strings are latin-1 decoded bytes)."""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = name
+        else:
+            key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+app = create_app()
+application = WsgiToAsgi(app.wsgi_app, max_threads=app.config["ASGI_THREADS"])
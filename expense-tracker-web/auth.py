@@ -0,0 +1,123 @@
+"""
+Password hashing for the login and register views.
+
+The hash method and cost come from app.config["PASSWORD_HASH_METHOD"] (any
+method werkzeug's generate_password_hash() accepts, e.g. "scrypt:32768:8:1" or
+"pbkdf2:sha256:600000"). Stored hashes record the method they were made with,
+so after a change a user's hash is upgraded the next time they log in.
+
+Hashing is deliberately slow, so it runs on a small pool of AUTH_WORKERS
+threads (hashlib releases the GIL while it works). A burst of logins then
+uses at most that many cores and queues for them, rather than tying up every
+request thread. More than AUTH_MAX_PENDING queued checks raise AuthBusy.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Hashing settings, overridable from app.config via init_auth().
+SETTINGS = {
+    "PASSWORD_HASH_METHOD": "scrypt:32768:8:1",
+    "AUTH_WORKERS": 2,
+    "AUTH_MAX_PENDING": 32,
+    "AUTH_TIMEOUT": 10.0,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class AuthBusy(Exception):
+    """Too many password checks are already waiting; the client should retry later."""
+
+
+class HashPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args, timeout: float):
+        if not self.slots.acquire(blocking=False):
+            raise AuthBusy
+        future = self.executor.submit(fn, *args)
+        # The slot is held until the hash is done, even if the caller gave up waiting.
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise AuthBusy from None
+
+
+def init_auth(app) -> None:
+    for key in SETTINGS:
+        if key in app.config:
+            SETTINGS[key] = app.config[key]
+
+
+def get_pool() -> HashPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashPool(SETTINGS["AUTH_WORKERS"], SETTINGS["AUTH_MAX_PENDING"])
+    return _pool
+
+
+def _reset_after_fork() -> None:
+    # A forked worker (e.g. gunicorn --preload) makes its own hashing threads on first use.
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@lru_cache(maxsize=8)
+def method_prefix(method: str) -> str:
+    """The method as werkzeug writes it into a hash ("scrypt" -> "scrypt:32768:8:1")."""
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def make_hash(raw_password: str) -> str:
+    return generate_password_hash(raw_password, method=SETTINGS["PASSWORD_HASH_METHOD"])
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return password_hash.split("$", 1)[0] != method_prefix(SETTINGS["PASSWORD_HASH_METHOD"])
+
+
+def _check(password_hash: str | None, raw_password: str):
+    if password_hash is None:
+        check_password_hash(_dummy_hash(SETTINGS["PASSWORD_HASH_METHOD"]), raw_password)
+        return False, None
+    if not check_password_hash(password_hash, raw_password):
+        return False, None
+    return True, make_hash(raw_password) if needs_rehash(password_hash) else None
+
+
+def hash_password(raw_password: str) -> str:
+    """make_hash() on the hashing pool."""
+    return get_pool().run(make_hash, raw_password, timeout=SETTINGS["AUTH_TIMEOUT"])
+
+
+def verify_password(password_hash: str | None, raw_password: str):
+    """
+    Check a password on the hashing pool.
+
+    password_hash is None for an unknown email; a dummy hash is checked instead
+    so the response takes as long as for a real account.
+
+    Returns:
+        ok (bool): whether the password matched
+        new_hash (str | None): a hash with the current settings, if the stored one is out of date
+    """
+    return get_pool().run(_check, password_hash, raw_password, timeout=SETTINGS["AUTH_TIMEOUT"])
+
+
+@lru_cache(maxsize=8)
+def _dummy_hash(method: str) -> str:
+    return generate_password_hash("not a real password", method=method)
@@ -0,0 +1,138 @@
+"""
+Expense statistics: plain Python loops vs the numpy columns in analytics.py.
+
+Both sides compute the same thing (per-category and per-month count, sum,
+mean, median and percentiles, month-over-month deltas, rolling 3/12-month
+averages) and the results are compared before the timings are printed.
+
+Usage:
+    python benchmarks/bench_analytics.py            # 10,000,000 rows
+    python benchmarks/bench_analytics.py --rows 1000000
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import PERCENTILES, ExpenseColumns, month_label, summarize  # noqa: E402
+
+CATEGORIES = ["food", "rent", "travel", "utilities", "fun", "health", "gifts", "transport"]
+
+
+def make_columns(rows: int, seed: int = 1) -> ExpenseColumns:
+    rng = np.random.default_rng(seed)
+    # Skewed like real spending: a few categories take most of the rows.
+    weights = np.array([0.35, 0.05, 0.1, 0.1, 0.15, 0.05, 0.05, 0.15])
+    return ExpenseColumns(
+        amounts=np.round(rng.lognormal(3, 1, rows), 2),
+        months=rng.integers(2020 * 12, 2026 * 12, rows).astype(np.int32),
+        categories=rng.choice(len(CATEGORIES), rows, p=weights).astype(np.int32),
+        category_names=list(CATEGORIES),
+    )
+
+
+def percentile(sorted_values, q):
+    """np.percentile's default (linear) interpolation, by hand."""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def group_loop(pairs):
+    groups = {}
+    for key, amount in pairs:
+        groups.setdefault(key, []).append(amount)
+
+    stats = {}
+    for key, values in groups.items():
+        values.sort()
+        row = {"count": len(values), "sum": sum(values), "mean": sum(values) / len(values),
+               "median": percentile(values, 50)}
+        for q in PERCENTILES:
+            row[f"p{q}"] = percentile(values, q)
+        stats[key] = row
+    return stats
+
+
+def summarize_loop(amounts, categories, months) -> dict:
+    """The same numbers as analytics.summarize(), one row at a time."""
+    by_category = group_loop(zip(categories, amounts))
+    by_month = group_loop(zip(months, amounts))
+
+    month_rows = []
+    sums = []
+    first, last = min(by_month), max(by_month)
+    for month in range(first, last + 1):
+        row = dict(by_month.get(month, {"count": 0, "sum": 0.0}))
+        sums.append(row["sum"])
+        row["month"] = month_label(month)
+        row["delta"] = sums[-1] - sums[-2] if len(sums) > 1 else None
+        row["rolling_3"] = sum(sums[-3:]) / 3 if len(sums) >= 3 else None
+        row["rolling_12"] = sum(sums[-12:]) / 12 if len(sums) >= 12 else None
+        month_rows.append(row)
+
+    return {
+        "count": len(amounts),
+        "total": sum(amounts),
+        "by_category": {CATEGORIES[code]: row for code, row in by_category.items()},
+        "by_month": month_rows,
+    }
+
+
+def close(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def compare(vectorized: dict, looped: dict) -> None:
+    assert vectorized["count"] == looped["count"]
+    assert close(vectorized["total"], looped["total"])
+    for row in vectorized["by_category"]:
+        expected = looped["by_category"][row["category"]]
+        for key, value in expected.items():
+            assert close(row[key], value), (row["category"], key, row[key], value)
+    assert len(vectorized["by_month"]) == len(looped["by_month"])
+    for row, expected in zip(vectorized["by_month"], looped["by_month"]):
+        for key, value in expected.items():
+            if key == "month":
+                assert row[key] == value
+            else:
+                assert close(row[key], value), (row["month"], key, row[key], value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    columns = make_columns(args.rows)
+
+    started = time.perf_counter()
+    vectorized = summarize(columns)
+    numpy_time = time.perf_counter() - started
+
+    # The loops get plain Python lists, like the CLI's records.
+    amounts = columns.amounts.tolist()
+    categories = columns.categories.tolist()
+    months = columns.months.tolist()
+    started = time.perf_counter()
+    looped = summarize_loop(amounts, categories, months)
+    loop_time = time.perf_counter() - started
+
+    compare(vectorized, looped)
+
+    print(f"{args.rows:,} rows, {len(CATEGORIES)} categories, {len(vectorized['by_month'])} months")
+    print(f"python loops:  {loop_time:8.2f} s")
+    print(f"numpy columns: {numpy_time:8.2f} s  ({loop_time / numpy_time:.1f}x)")
+    print("results match")
+
+
+if __name__ == "__main__":
+    main()
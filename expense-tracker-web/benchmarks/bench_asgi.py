@@ -0,0 +1,194 @@
+"""
+Load test: the app under the threaded WSGI server vs under uvicorn (asgi.py).
+
+Usage:
+    python benchmarks/bench_asgi.py                       # 50, 200 and 1000 clients, 10 s each
+    python benchmarks/bench_asgi.py --clients 50 --duration 5 --rows 20000
+
+Each mode runs in its own server process on a seeded copy of the database.
+The clients are plain asyncio connections (HTTP/1.1 keep-alive), each
+sending one request at a time from a mix of the index, stats, API and export
+routes, so "clients" is the number of requests in flight. They all share
+one logged-in session, made by registering a benchmark user up front.
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from bench_export import seed
+
+APP_DIR = Path(__file__).resolve().parent.parent
+HOST = "127.0.0.1"
+
+SERVERS = {
+    "wsgi": [sys.executable, "-c",
+             "import sys; from werkzeug.serving import run_simple; from app import create_app; "
+             "run_simple(sys.argv[1], int(sys.argv[2]), create_app(), threaded=True)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:application", "--log-level", "warning", "--host"],
+}
+
+# (weight, path): mostly page loads and polling, some exports of one month.
+MIX = [
+    (30, "/"),
+    (15, "/?category=food"),
+    (10, "/?month=2020-03"),
+    (15, "/stats"),
+    (10, "/api/expenses?category=rent"),
+    (15, "/api/stats?month=2020-02"),
+    (5, "/export.csv?month=2020-01"),
+]
+
+
+def server_command(mode: str, port: int) -> list[str]:
+    if mode == "wsgi":
+        return SERVERS[mode] + [HOST, str(port)]
+    return SERVERS[mode] + [HOST, "--port", str(port)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def log_in(port: int) -> str:
+    """Register and log in the benchmark user; returns the Cookie header for its session."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    form = urllib.parse.urlencode({"email": "bench@example.com", "password": "bench"}).encode()
+    opener.open(f"http://{HOST}:{port}/register", form).read()
+    opener.open(f"http://{HOST}:{port}/login", form).read()
+    if not any(cookie.name == "session" for cookie in jar):
+        raise RuntimeError("could not log in")
+    return "; ".join(f"{cookie.name}={cookie.value}" for cookie in jar)
+
+
+async def read_response(reader) -> tuple[int, bool]:
+    """Read one response; returns (status, keep_alive)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection") != "close"
+
+
+async def client(port: int, cookie: str, deadline: float, latencies: list, errors: list) -> None:
+    paths = [path for weight, path in MIX for _ in range(weight)]
+    reader = writer = None
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            path = random.choice(paths)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {HOST}\r\nCookie: {cookie}\r\n\r\n".encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            # Anything but a page (e.g. a redirect to /login) means the run isn't measuring the routes.
+            if status >= 300:
+                errors.append(status)
+            else:
+                latencies.append(time.perf_counter() - started)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port: int, cookie: str, clients: int, duration: float) -> tuple[list, list, float]:
+    latencies, errors = [], []
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(client(port, cookie, deadline, latencies, errors) for _ in range(clients)))
+    return latencies, errors, time.monotonic() - started
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level.")
+    parser.add_argument("--modes", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--app-dir", type=Path, default=APP_DIR)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        print(f"Seeding {args.rows:,} rows...")
+        seed(db_path, args.rows)
+        env = dict(os.environ, EXPENSES_DB=str(db_path), EXPENSES_USERS_DB=f"sqlite:///{Path(tmp) / 'users.db'}")
+
+        print(f"{'mode':<5} {'clients':>7} {'requests':>9} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+        for mode in args.modes:
+            port = free_port()
+            server = subprocess.Popen(server_command(mode, port), cwd=args.app_dir, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(port)
+                cookie = log_in(port)
+                for clients in args.clients:
+                    latencies, errors, elapsed = asyncio.run(load(port, cookie, clients, args.duration))
+                    print(f"{mode:<5} {clients:>7} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+                          f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 99) * 1000:>9.1f} "
+                          f"{len(errors):>7} {sorted(set(map(str, errors)))}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Auth costs: login throughput during a burst, and what the login adds to every request.
+
+Usage:
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --threads 16 --duration 5 --methods scrypt:32768:8:1 pbkdf2:sha256:600000
+
+Login burst: --threads threads log in over and over for --duration seconds
+while one more thread keeps loading /api/expenses. Each hash method is run
+with AUTH_WORKERS = 1, 2 and --threads (the last is no limit at all, as if
+every request thread hashed for itself). The table shows logins/s, logins
+turned away with a 503, and the page's latency while the burst is going on.
+
+Per-request overhead: the same page with the login switched off, logged in
+with the user cache, and logged in with the cache emptied before every
+request (a users-table lookup per request, as before the cache).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+ACCOUNT = {"email": "bench@example.com", "password": "correct horse battery staple"}
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    response = client.post("/login", data=ACCOUNT)
+    assert response.location == "/", "could not log in"
+    return client
+
+
+def login_burst(app, method: str, workers: int, threads: int, duration: float) -> dict:
+    import auth
+
+    auth.SETTINGS.update(PASSWORD_HASH_METHOD=method, AUTH_WORKERS=workers, AUTH_MAX_PENDING=threads)
+    auth._pool = None  # rebuilt with the settings above on first use
+    page_client = logged_in_client(app)  # also rehashes the password with this method
+
+    deadline = time.monotonic() + duration
+    logins, busy, page_latencies = [], [], []
+
+    def log_in_repeatedly():
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            response = client.post("/login", data=ACCOUNT)
+            if response.status_code == 503:
+                busy.append(1)
+            elif response.location == "/":
+                logins.append(1)
+            client.get("/logout")
+
+    def load_page():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            page_client.get("/api/expenses")
+            page_latencies.append(time.perf_counter() - started)
+
+    runners = [threading.Thread(target=log_in_repeatedly) for _ in range(threads)]
+    runners.append(threading.Thread(target=load_page))
+    started = time.monotonic()
+    for thread in runners:
+        thread.start()
+    for thread in runners:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "logins_per_s": len(logins) / elapsed,
+        "busy": len(busy),
+        "page_p50_ms": percentile(page_latencies, 50) * 1000,
+        "page_p95_ms": percentile(page_latencies, 95) * 1000,
+    }
+
+
+def per_request(app, requests: int) -> dict:
+    from app import users
+
+    client = logged_in_client(app)
+    for _ in range(requests // 4):  # warm up
+        client.get("/api/expenses")
+    results = {}
+    for label in ("login disabled", "logged in, cached user", "logged in, no user cache"):
+        app.config["LOGIN_DISABLED"] = label == "login disabled"
+        latencies = []
+        for _ in range(requests):
+            if label == "logged in, no user cache":
+                users.clear()
+            started = time.perf_counter()
+            response = client.get("/api/expenses")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        results[label] = percentile(latencies, 50) * 1e6
+    app.config["LOGIN_DISABLED"] = False
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Threads logging in at once.")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per login burst.")
+    parser.add_argument("--methods", nargs="+", default=["scrypt:32768:8:1", "pbkdf2:sha256:600000"])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per overhead measurement.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # db.py reads EXPENSES_DB at import, create_app() the others.
+        os.environ["EXPENSES_DB"] = str(Path(tmp) / "expenses.db")
+        os.environ["EXPENSES_USERS_DB"] = f"sqlite:///{Path(tmp) / 'users.db'}"
+        sys.path.insert(0, str(APP_DIR))
+        from app import create_app
+
+        app = create_app()
+
+        client = app.test_client()
+        client.post("/register", data=ACCOUNT)
+        client = logged_in_client(app)
+        for i in range(100):
+            client.post("/add", data={"amount": "4.20", "category": "food", "description": f"lunch {i}"})
+
+        print(f"Login burst: {args.threads} threads logging in, 1 thread loading /api/expenses")
+        print(f"{'method':<24} {'workers':>7} {'logins/s':>9} {'503s':>6} {'page p50 ms':>12} {'page p95 ms':>12}")
+        for method in args.methods:
+            for workers in sorted({1, 2, args.threads}):
+                result = login_burst(app, method, workers, args.threads, args.duration)
+                print(f"{method:<24} {workers:>7} {result['logins_per_s']:>9.1f} {result['busy']:>6} "
+                      f"{result['page_p50_ms']:>12.2f} {result['page_p95_ms']:>12.2f}")
+
+        print(f"\nPer-request cost of /api/expenses (p50 of {args.requests:,} requests)")
+        overhead = per_request(app, args.requests)
+        baseline = overhead["login disabled"]
+        for label, micros in overhead.items():
+            print(f"{label:<26} {micros:>8.0f} us  ({micros - baseline:+.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Peak memory of /export.csv: the old buffered export vs the streaming one.
+
+Usage:
+    python benchmarks/bench_export.py            # 1,000,000 rows
+    python benchmarks/bench_export.py --rows 200000
+
+Each variant runs in its own process so ru_maxrss only sees that variant.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+EXPORT_SQL = "SELECT id, created_at, category, description, amount FROM expenses ORDER BY created_at DESC"
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def seed(path: Path, rows: int) -> None:
+    categories = ["food", "rent", "travel", "utilities", "fun", "health"]
+    start = datetime(2020, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executescript((APP_DIR / "schema.sql").read_text(encoding="utf-8"))
+    conn.executemany(
+        "INSERT INTO expenses (amount, category, description, created_at) VALUES (?, ?, ?, ?)",
+        (
+            (
+                round(random.uniform(1, 200), 2),
+                random.choice(categories),
+                f"expense {i}",
+                (start + timedelta(minutes=i)).isoformat(timespec="seconds"),
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_before() -> tuple[float, int]:
+    """The pre-streaming export: fetchall() into a list, then build the whole CSV."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(os.environ["EXPENSES_DB"])
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(EXPORT_SQL).fetchall()
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["id", "created_at", "category", "description", "amount"])
+    for r in rows:
+        writer.writerow([r["id"], r["created_at"], r["category"], r["description"], r["amount"]])
+    body = output.getvalue().encode("utf-8")
+
+    # Nothing can be sent until the whole body exists.
+    return time.perf_counter() - started, len(body)
+
+
+def run_after() -> tuple[float, int]:
+    """The streaming route, consumed chunk by chunk like a real client would."""
+    sys.path.insert(0, str(APP_DIR))
+    from app import create_app
+
+    app = create_app()
+    # This measures the export itself, not the login in front of it.
+    app.config["LOGIN_DISABLED"] = True
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    response = app.test_client().get("/export.csv", buffered=False)
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    return first_byte or 0.0, size
+
+
+def child(mode: str) -> None:
+    first_byte, size = run_before() if mode == "before" else run_after()
+    print(f"{mode},{first_byte:.4f},{size},{peak_rss_mb():.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--mode", choices=["before", "after"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args.mode)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        print(f"Seeding {args.rows:,} rows...")
+        seed(db_path, args.rows)
+
+        env = dict(os.environ, EXPENSES_DB=str(db_path))
+        print(f"{'variant':<8} {'first byte (s)':>15} {'size (MB)':>10} {'peak RSS (MB)':>14}")
+        for mode in ("before", "after"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            _, first_byte, size, rss = out.split(",")
+            print(f"{mode:<8} {float(first_byte):>15.3f} {int(size) / 1e6:>10.1f} {float(rss):>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Template rendering: fragment cache off vs warm, and template compilation vs bytecode cache.
+
+Usage:
+    python benchmarks/bench_render.py                  # 10,000-row pages
+    python benchmarks/bench_render.py --rows 2000 --requests 50
+
+Pages: the index with every row on one page (?per_page=--rows) and the stats
+page, over a database with --rows expenses spread over --categories
+categories and ten years of months. The query results are cached both ways,
+so the difference is the rendering that {% cache %} skips.
+
+Compilation: a fresh process loads every template with an empty
+TEMPLATE_CACHE_DIR (compiled and written to it), then another fresh process
+loads them again from the bytecode it left.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+def seed(path: Path, rows: int, categories: int) -> None:
+    start = datetime(2016, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executescript((APP_DIR / "schema.sql").read_text(encoding="utf-8"))
+    conn.executemany(
+        "INSERT INTO expenses (amount, category, description, created_at) VALUES (?, ?, ?, ?)",
+        (
+            (
+                round(random.uniform(1, 200), 2),
+                f"category {random.randrange(categories)}",
+                f"expense <{i}> & more",
+                (start + timedelta(minutes=random.randrange(10 * 365 * 1440))).isoformat(timespec="seconds"),
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def time_page(client, url: str, requests: int) -> float:
+    client.get(url)  # warm the result cache (and the fragment, when it is on)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return percentile(latencies, 50) * 1000
+
+
+def load_templates() -> None:
+    """Child process: time loading every template (compiling, or reading bytecode)."""
+    sys.path.insert(0, str(APP_DIR))
+    from app import create_app
+
+    app = create_app()
+    names = app.jinja_env.list_templates()
+    started = time.perf_counter()
+    for name in names:
+        app.jinja_env.get_template(name)
+    print(f"{len(names)} {(time.perf_counter() - started) * 1000:.2f}")
+
+
+def compile_times(tmp: Path) -> list:
+    env = dict(os.environ, EXPENSES_TEMPLATE_CACHE=str(tmp / "jinja"))
+    results = []
+    for _ in range(2):
+        output = subprocess.run(
+            [sys.executable, __file__, "--load-templates"], env=env, check=True, capture_output=True, text=True
+        ).stdout.split()
+        results.append((int(output[-2]), float(output[-1])))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--load-templates", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load_templates:
+        load_templates()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # db.py reads EXPENSES_DB at import, create_app() the others.
+        os.environ["EXPENSES_DB"] = str(tmp / "expenses.db")
+        os.environ["EXPENSES_USERS_DB"] = f"sqlite:///{tmp / 'users.db'}"
+        os.environ["EXPENSES_TEMPLATE_CACHE"] = str(tmp / "jinja")
+        seed(tmp / "expenses.db", args.rows, args.categories)
+
+        sys.path.insert(0, str(APP_DIR))
+        from app import create_app, fragments
+
+        app = create_app()
+
+        # This measures rendering, not the login in front of it.
+        app.config["LOGIN_DISABLED"] = True
+        app.config["MAX_PAGE_SIZE"] = args.rows
+        client = app.test_client()
+        pages = {"index": f"/?per_page={args.rows}", "stats": "/stats"}
+
+        print(f"{args.rows:,} expenses, {args.categories:,} categories; p50 of {args.requests} requests")
+        print(f"{'page':<8} {'no fragment cache':>18} {'warm fragments':>15}")
+        for name, url in pages.items():
+            app.jinja_env.fragment_cache = None
+            uncached = time_page(client, url, args.requests)
+            app.jinja_env.fragment_cache = fragments
+            cached = time_page(client, url, args.requests)
+            print(f"{name:<8} {uncached:>16.2f}ms {cached:>13.2f}ms  ({uncached / cached:.1f}x)")
+
+        (cold_count, cold), (_, warm) = compile_times(tmp)
+        print(f"\nLoading all {cold_count} templates in a fresh process")
+        print(f"compiled:            {cold:>8.2f}ms")
+        print(f"from bytecode cache: {warm:>8.2f}ms  ({cold / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
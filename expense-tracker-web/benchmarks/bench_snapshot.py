@@ -0,0 +1,107 @@
+"""
+Cold-start statistics: parsing expenses.json vs opening a binary snapshot.
+
+Writes a CLI-style expenses.json with --rows expenses, snapshots it (see
+snapshot.py), then times what it takes to get from a file on disk to the
+analytics columns and to analytics.summarize() both ways. The two summaries
+are compared before the timings are printed.
+
+Usage:
+    python benchmarks/bench_snapshot.py            # 2,000,000 rows
+    python benchmarks/bench_snapshot.py --rows 10000000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import ExpenseColumns, summarize  # noqa: E402
+from snapshot import Snapshot, write_snapshot  # noqa: E402
+
+CATEGORIES = ["food", "rent", "travel", "utilities", "fun", "health", "gifts", "transport"]
+
+
+def make_file(path: Path, rows: int) -> None:
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    rng = random.Random(1)
+    with open(path, "w") as file:
+        file.write("[")
+        for i in range(rows):
+            record = {
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "amount": round(rng.lognormvariate(3, 1), 2),
+                "category": rng.choice(CATEGORIES),
+                "description": f"benchmark {i % 1000}",
+                "timestamp": (start + timedelta(seconds=rng.randrange(6 * 365 * 86400))).isoformat(),
+            }
+            file.write(("," if i else "") + json.dumps(record))
+        file.write("]")
+
+
+def columns_from_json(path: Path) -> ExpenseColumns:
+    """What the CLI has to do without a snapshot: parse everything, then build the columns."""
+    with open(path) as file:
+        records = json.load(file)
+    return ExpenseColumns.from_rows((e["amount"], e["category"], e["timestamp"][:7]) for e in records)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def same(a: dict, b: dict) -> bool:
+    if a["count"] != b["count"] or not math.isclose(a["total"], b["total"], rel_tol=1e-9):
+        return False
+    return [(r["category"], r["count"]) for r in a["by_category"]] == \
+        [(r["category"], r["count"]) for r in b["by_category"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "expenses.json"
+        snapshot_path = Path(tmp) / "expenses.snapshot"
+        make_file(json_path, args.rows)
+
+        def write():
+            with open(json_path) as file:
+                records = json.load(file)
+            rows = ((e["id"], e["amount"], e["category"], e["description"], e["timestamp"]) for e in records)
+            return write_snapshot(snapshot_path, rows)
+
+        _, write_time = timed(write)
+
+        json_columns, json_load = timed(lambda: columns_from_json(json_path))
+        json_summary, json_stats = timed(lambda: summarize(json_columns))
+
+        snap, snap_open = timed(lambda: Snapshot(snapshot_path))
+        snap_columns, snap_load = timed(snap.columns)
+        snap_summary, snap_stats = timed(lambda: summarize(snap_columns))
+        assert same(json_summary, snap_summary), "summaries differ"
+        snap_columns = None  # drop the numpy views so the mmap can close
+        snap.close()
+
+        print(f"{args.rows:,} rows: expenses.json {json_path.stat().st_size / 1e6:,.0f} MB, "
+              f"snapshot {snapshot_path.stat().st_size / 1e6:,.0f} MB (written in {write_time:.2f} s)")
+        print(f"{'':<22} {'to columns':>12} {'+ summarize':>12}")
+        print(f"{'parse expenses.json':<22} {json_load * 1000:>10.1f}ms {(json_load + json_stats) * 1000:>10.1f}ms")
+        snap_ready = snap_open + snap_load
+        print(f"{'open snapshot (mmap)':<22} {snap_ready * 1000:>10.1f}ms {(snap_ready + snap_stats) * 1000:>10.1f}ms")
+        print(f"to columns: {json_load / snap_ready:,.0f}x faster; summaries match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Startup cost of the web app: importing it, building it and its first requests.
+
+Usage:
+    python benchmarks/bench_startup.py                      # 10 fresh processes
+    python benchmarks/bench_startup.py --save-baseline      # store this run as the baseline
+    python benchmarks/bench_startup.py --threshold 0.25     # fail on a >25% regression
+
+Every run is a fresh Python process, like a new worker or a `flask` command:
+
+    import app      importing app.py (and everything it imports)
+    create_app()    building the Flask app from the default config
+    1st request     GET / on that app: the schema check, the first pooled
+                    connection, loading templates, the queries
+    2nd request     GET / again, with everything set up (caches cleared)
+    1st /api/stats  the first request that needs numpy (analytics.py)
+
+The database is migrated once beforehand, as a deploy's `flask init-db`
+would, and the workers run with AUTO_MIGRATE off. Compiled templates are
+kept between runs (TEMPLATE_CACHE_DIR), as they are between restarts. The
+medians are saved as JSON and compared against a stored baseline like
+bench_suite.py's: the run fails (exit code 1) when a step is more than
+--threshold slower.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+STEPS = ["import app", "create_app()", "1st request", "2nd request", "1st /api/stats"]
+# Steps under this many ms are too noisy to call a regression on.
+MIN_COMPARED_MS = 1.0
+
+
+def measure_once() -> None:
+    """Child process: time each step and print them as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    sys.path.insert(0, str(APP_DIR))
+    from app import create_app, results
+
+    timings["import app"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app = create_app({"LOGIN_DISABLED": True, "AUTO_MIGRATE": False})
+    timings["create_app()"] = time.perf_counter() - started
+
+    client = app.test_client()
+    for step, path in (("1st request", "/"), ("2nd request", "/"), ("1st /api/stats", "/api/stats")):
+        results.clear()
+        started = time.perf_counter()
+        response = client.get(path)
+        timings[step] = time.perf_counter() - started
+        assert response.status_code == 200, (path, response.status_code)
+    print(json.dumps({step: seconds * 1000 for step, seconds in timings.items()}))
+
+
+def run(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure-once"], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Steps whose median got more than `threshold` (a fraction) slower than the baseline."""
+    regressions = []
+    for step, ms in current["steps"].items():
+        before = baseline["steps"].get(step)
+        if before is None or before < MIN_COMPARED_MS:
+            continue
+        change = ms / before - 1
+        if change > threshold:
+            regressions.append(f"{step}: {before:.1f} ms -> {ms:.1f} ms (+{change:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh processes to take the median of.")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "startup.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline-startup.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to the baseline file.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown per step, as a fraction.")
+    parser.add_argument("--measure-once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_once:
+        measure_once()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        env = dict(
+            os.environ,
+            EXPENSES_DB=str(tmp / "expenses.db"),
+            EXPENSES_USERS_DB=f"sqlite:///{tmp / 'users.db'}",
+            EXPENSES_TEMPLATE_CACHE=str(tmp / "jinja"),
+            EXPENSES_JOB_DIR=str(tmp / "jobs"),
+        )
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"],
+                       cwd=APP_DIR, env=env, check=True, capture_output=True)
+        run(env)  # compiles the templates into the bytecode cache and warms the OS file cache
+        runs = [run(env) for _ in range(args.runs)]
+
+    steps = {step: round(statistics.median(r[step] for r in runs), 2) for step in STEPS}
+    print(f"Median of {args.runs} fresh processes")
+    for step, ms in steps.items():
+        print(f"{step:<16} {ms:>9.2f}ms")
+    print(f"{'ready to serve':<16} {sum(steps[s] for s in STEPS[:3]):>9.2f}ms  (import + create_app() + 1st request)")
+
+    current = {
+        "meta": {
+            "runs": args.runs,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "steps": steps,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    args.output.write_text(json.dumps(current, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    regressions = compare(current, json.loads(args.baseline.read_text()), args.threshold)
+    if regressions:
+        print(f"\nRegressions against {args.baseline} (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print("  " + line)
+        raise SystemExit(1)
+    print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
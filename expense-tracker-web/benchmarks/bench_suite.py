@@ -0,0 +1,282 @@
+"""
+Benchmark suite for the web app: latency, throughput and memory per route,
+saved as JSON and compared against a stored baseline.
+
+Usage:
+    python benchmarks/bench_suite.py                            # small ledger (10k rows)
+    python benchmarks/bench_suite.py --size medium              # 1M rows
+    python benchmarks/bench_suite.py --size large               # 10M rows
+    python benchmarks/bench_suite.py --save-baseline            # store this run as the baseline
+    python benchmarks/bench_suite.py --threshold 0.1            # fail on a >10% regression
+
+Ledgers are generated once into benchmarks/data/expenses-<size>.db (delete the
+file to regenerate) with skewed categories and a spending volume that grows
+month by month. Every scenario runs through the Flask test client:
+
+    /, /stats and /export.csv with no filter, a category, a month and both
+    add, edit and delete (rows added by the suite, so the ledger stays the same)
+
+The client registers and logs in first (benchmarks/data/users-<size>.db), so
+every request pays for the session and user lookup like a browser's would.
+
+The result, template fragment and dropdown caches are cleared before each read
+request by default, so the numbers track the queries and templates; pass
+--warm to keep them.
+
+Each scenario reports throughput, p50/p95/p99 latency and the peak memory
+allocated by one request (tracemalloc). The run fails (exit code 1) when a
+scenario's p95 latency is more than --threshold worse than the baseline's.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+SIZES = {"small": 10_000, "medium": 1_000_000, "large": 10_000_000}
+
+# Roughly Zipf: the first few categories take most of the spending.
+CATEGORIES = ["food", "transport", "rent", "utilities", "fun", "shopping",
+              "health", "travel", "gifts", "education", "pets", "charity"]
+MONTHS = 36
+SEED_BATCH = 50_000
+
+
+def category_weights() -> list[float]:
+    return [1 / (rank ** 1.1) for rank in range(1, len(CATEGORIES) + 1)]
+
+
+def month_starts() -> list[datetime]:
+    start = datetime(2023, 1, 1)
+    return [datetime(start.year + (start.month - 1 + i) // 12, (start.month - 1 + i) % 12 + 1, 1)
+            for i in range(MONTHS)]
+
+
+def seed(rows: int, seed_value: int = 1) -> None:
+    """Fill the (already migrated) database at $EXPENSES_DB with `rows` synthetic expenses."""
+    from db import get_conn
+    from importer import insert_batch
+
+    rng = random.Random(seed_value)
+    starts = month_starts()
+    # Later months have more rows: volume grows linearly over the period.
+    per_month = [i + 1 for i in range(MONTHS)]
+    scale = rows / sum(per_month)
+    counts = [int(n * scale) for n in per_month]
+    counts[-1] += rows - sum(counts)
+
+    weights = list(itertools.accumulate(category_weights()))
+    conn = get_conn()
+    batch = []
+    for month_start, count in zip(starts, counts):
+        for _ in range(count):
+            created_at = month_start + timedelta(seconds=rng.randrange(28 * 86400))
+            batch.append((
+                round(rng.lognormvariate(3, 1), 2),
+                rng.choices(CATEGORIES, cum_weights=weights)[0],
+                "benchmark",
+                created_at.isoformat(timespec="seconds"),
+            ))
+            if len(batch) >= SEED_BATCH:
+                insert_batch(conn, batch)
+                batch = []
+    if batch:
+        insert_batch(conn, batch)
+    conn.close()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+
+def measure(name: str, run, iterations: int, reset=None) -> dict:
+    """Time `iterations` calls of run(i) and one more under tracemalloc for peak memory."""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        if reset:
+            reset()
+        t = time.perf_counter()
+        run(i)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    run(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    result = {
+        "requests": iterations,
+        "throughput_rps": round(iterations / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+    print(f"{name:<34} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+          f"{result['p99_ms']:>9.2f} {result['peak_kb']:>10.1f}")
+    return result
+
+
+def run_suite(iterations: int, export_iterations: int, warm: bool) -> dict:
+    from app import clear_caches, create_app
+    from db import get_conn
+
+    app = create_app()
+    client = app.test_client()
+    account = {"email": "bench@example.com", "password": "bench"}
+    client.post("/register", data=account)  # already registered on later runs; that's fine
+    assert client.post("/login", data=account).location == "/", "could not log in"
+
+    with get_conn() as conn:
+        sample = conn.execute(
+            "SELECT category, month FROM expense_rollup ORDER BY count DESC LIMIT 1"
+        ).fetchone()
+    filters = {
+        "all": {},
+        "category": {"category": sample["category"]},
+        "month": {"month": sample["month"]},
+        "category+month": {"category": sample["category"], "month": sample["month"]},
+    }
+
+    def get(path, params):
+        def run(_):
+            response = client.get(path, query_string=params)
+            for _ in response.response:  # drain streamed bodies
+                pass
+            response.close()
+            assert response.status_code == 200, (path, params, response.status_code)
+        return run
+
+    print(f"{'scenario':<34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KB':>10}")
+    scenarios = {}
+    for route, path, n in (("index", "/", iterations), ("stats", "/stats", iterations),
+                           ("export", "/export.csv", export_iterations)):
+        for label, params in filters.items():
+            name = f"{route} [{label}]"
+            scenarios[name] = measure(name, get(path, params), n, None if warm else clear_caches)
+
+    # Writes work on rows the suite adds itself, so the ledger ends up unchanged.
+    added = []
+
+    def add(i):
+        client.post("/add", data={"amount": "12.34", "category": sample["category"], "description": f"suite {i}"})
+        with get_conn() as conn:
+            added.append(conn.execute("SELECT MAX(id) FROM expenses").fetchone()[0])
+
+    def edit(i):
+        client.post(f"/edit/{added[i % len(added)]}",
+                    data={"amount": "43.21", "category": sample["category"], "description": "edited"})
+
+    def delete(i):
+        client.post(f"/delete/{added.pop()}")
+
+    scenarios["add"] = measure("add", add, iterations)
+    scenarios["edit"] = measure("edit", edit, iterations)
+    scenarios["delete"] = measure("delete", delete, iterations)
+    while added:
+        delete(0)
+    return scenarios
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Scenarios whose p95 got more than `threshold` (a fraction) slower than the baseline."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None or before["p95_ms"] <= 0:
+            continue
+        change = result["p95_ms"] / before["p95_ms"] - 1
+        if change > threshold:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms (+{change:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario.")
+    parser.add_argument("--export-iterations", type=int, default=5, help="Requests per export scenario.")
+    parser.add_argument("--warm", action="store_true", help="Keep the result caches between requests.")
+    parser.add_argument("--output", type=Path, default=None, help="Defaults to results/<size>.json.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Defaults to results/baseline-<size>.json.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to the baseline file.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 slowdown, as a fraction.")
+    args = parser.parse_args()
+
+    rows = SIZES[args.size]
+    db_path = DATA_DIR / f"expenses-{args.size}.db"
+    output = args.output or RESULTS_DIR / f"{args.size}.json"
+    baseline_path = args.baseline or RESULTS_DIR / f"baseline-{args.size}.json"
+
+    # db.py reads the path at import, so this has to come before any app import.
+    os.environ["EXPENSES_DB"] = str(db_path)
+    os.environ["EXPENSES_USERS_DB"] = f"sqlite:///{DATA_DIR / f'users-{args.size}.db'}"
+    sys.path.insert(0, str(APP_DIR))
+    import db
+
+    fresh = not db_path.exists()
+    DATA_DIR.mkdir(exist_ok=True)
+    db.init_db()
+    if fresh:
+        print(f"Generating {rows:,} rows into {db_path}...")
+        started = time.perf_counter()
+        seed(rows)
+        print(f"  done in {time.perf_counter() - started:.1f} s")
+
+    scenarios = run_suite(args.iterations, args.export_iterations, args.warm)
+    current = {
+        "meta": {
+            "size": args.size,
+            "rows": rows,
+            "warm": args.warm,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                 / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        },
+        "scenarios": scenarios,
+    }
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output.write_text(json.dumps(current, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(current, indent=2))
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one.")
+        return
+
+    regressions = compare(current, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f"\nRegressions against {baseline_path} (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print("  " + line)
+        raise SystemExit(1)
+    print(f"No regressions against {baseline_path} (threshold {args.threshold:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
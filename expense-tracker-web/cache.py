@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable
+
+
+class DimensionCache:
+    """
+    Process-local cache for the category and month dropdown lists.
+
+    The write handlers call invalidate(). Every worker process keeps its own copy
+    and only sees its own writes, so `ttl` bounds how stale another process's
+    lists can get. As in ResultCache, lists loaded while an invalidate() ran
+    are returned but not kept.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def get(self, load: Callable[[], tuple]):
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._value
+            generation = self._generation
+
+        value = load()
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._loaded_at = time.monotonic()
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+            self._generation += 1
+
+
+class DataVersion:
+    """
+    Change counter for the expenses table, for ETags and Last-Modified.
+
+    read() returns the (version, changed_at) row that the triggers of
+    migrations 0005 and 0006 keep up to date. Writes from any process move it
+    on, and a conditional GET costs that one primary-key read instead of the
+    page's queries. changed_at is the second of the last change, so changes
+    within one second share it: last_modified is None until that second is
+    over, and only the version in the ETag tells them apart.
+    """
+
+    def __init__(self, read: Callable[[], tuple]):
+        self.read = read
+
+    def current(self) -> tuple[int, str, datetime | None]:
+        """(version, etag, last_modified) for the data as it is now."""
+        version, changed_at = self.read()
+        if changed_at >= int(time.time()):
+            return version, f"{version}-{changed_at}", None
+        return version, f"{version}-{changed_at}", datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+class ResultCache:
+    """
+    Process-local LRU cache of query results for the filtered views.
+
+    Keys are (route, category, month, ...) tuples; "" in the category or month
+    slot means that filter isn't applied. After a write, invalidate() drops only
+    the entries the written row could appear in: the ones filtered on its
+    category, its month, both, or neither. `ttl` (None = no expiry) bounds how
+    stale an entry can be after another process's write.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def lookup(self, key: tuple):
+        """The cached value for key, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                if self.ttl is None or now - loaded_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def get(self, key: tuple, load: Callable[[], object]):
+        value = self.lookup(key)
+        if value is None:
+            generation = self.generation()
+            value = load()
+            self.put(key, value, generation)
+        return value
+
+    def generation(self) -> int:
+        """Moves on with every invalidation; take it before loading and hand it to put()."""
+        with self._lock:
+            return self._generation
+
+    def put(self, key: tuple, value, generation: int | None = None) -> None:
+        with self._lock:
+            # Something was invalidated while this value was being loaded, so it may be stale.
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, category: str, month: str) -> None:
+        """Drop every entry that a row with this category and month belongs to."""
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[1] in ("", category) and key[2] in ("", month)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self._generation += 1
+
+    def discard(self, key: tuple) -> None:
+        """Drop one entry, e.g. a user whose account just changed."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,15 +1,173 @@
+import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
 
-DB_PATH = Path(__file__).with_name("expenses.db")
+from flask import g, has_app_context
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.Connection(DB_PATH)
+from pool import ConnectionPool
+
+# EXPENSES_DB lets benchmarks and scripts point the app at another database file.
+DB_PATH = Path(os.environ.get("EXPENSES_DB", Path(__file__).with_name("expenses.db")))
+SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+
+# Connection settings, overridable from app.config via init_pool().
+SETTINGS = {
+    "DB_POOL_SIZE": 8,
+    "DB_POOL_TIMEOUT": 10.0,
+    "DB_CACHE_SIZE_KB": 16 * 1024,
+    "DB_MMAP_SIZE": 256 * 1024 * 1024,
+    "DB_BUSY_TIMEOUT_MS": 5000,
+}
+
+# Set by instrumentation.init_instrumentation(); left alone, connections are plain
+# sqlite3 connections and checkouts aren't timed.
+HOOKS = {
+    "connection_factory": sqlite3.Connection,
+    "on_checkout": None,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def connect() -> sqlite3.Connection:
+    """Open a new connection and apply the per-connection PRAGMAs once."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=SETTINGS["DB_BUSY_TIMEOUT_MS"] / 1000,
+        check_same_thread=False,  # pooled connections move between worker threads
+        factory=HOOKS["connection_factory"],
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{int(SETTINGS['DB_CACHE_SIZE_KB'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(SETTINGS['DB_MMAP_SIZE'])}")
+    conn.execute(f"PRAGMA busy_timeout = {int(SETTINGS['DB_BUSY_TIMEOUT_MS'])}")
     return conn
 
-def init_db() -> None:
-    schema_path = Path(__file__).with_name("schema.sql")
-    with get_conn() as conn:
-        conn.executescript(schema_path.read_text(encoding="utf-8"))
-        
\ No newline at end of file
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect,
+                    size=SETTINGS["DB_POOL_SIZE"],
+                    timeout=SETTINGS["DB_POOL_TIMEOUT"],
+                )
+    return _pool
+
+def _reset_after_fork() -> None:
+    # A forked worker (e.g. gunicorn --preload) makes its own connections on first use.
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def init_pool(app) -> None:
+    """Read pool settings from app.config and hand connections back at the end of each app context."""
+    for key in SETTINGS:
+        if key in app.config:
+            SETTINGS[key] = app.config[key]
+    app.teardown_appcontext(release_conn)
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Inside a request: the connection checked out for this app context (one per request).
+    Outside Flask (scripts, CLI tools): a fresh connection the caller should close.
+    """
+    if not has_app_context():
+        return connect()
+
+    conn = g.get("db_conn")
+    if conn is None:
+        on_checkout = HOOKS["on_checkout"]
+        if on_checkout is None:
+            conn = g.db_conn = get_pool().acquire()
+        else:
+            started = time.perf_counter()
+            conn = g.db_conn = get_pool().acquire()
+            on_checkout((time.perf_counter() - started) * 1000)
+        g.query_count = 0
+        conn.set_trace_callback(_count_query)
+    return conn
+
+def _count_query(sql: str) -> None:
+    # Statements run by triggers are traced too, prefixed with "-- TRIGGER".
+    if not sql.startswith("--"):
+        g.query_count += 1
+
+def query_count() -> int:
+    """How many statements this app context has run on its pooled connection."""
+    return g.get("query_count", 0)
+
+def release_conn(exc=None) -> None:
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        conn.set_trace_callback(None)
+        get_pool().release(conn)
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+def get_migrations() -> list[tuple[int, Path]]:
+    """schema.sql is version 1; migrations/NNNN_name.sql files take it from there."""
+    migrations = [(1, SCHEMA_PATH)]
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        migrations.append((int(path.name.split("_", 1)[0]), path))
+    return migrations
+
+def split_statements(script: str) -> list[str]:
+    """Split a .sql file into statements (trigger bodies stay in one piece)."""
+    statements = []
+    current = ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> list[int]:
+    """
+    Bring the database up to the latest schema version.
+
+    Each migration runs in its own IMMEDIATE transaction together with the
+    user_version bump, so a failed migration leaves the file untouched and two
+    processes starting at once can't both apply the same step.
+
+    Returns:
+        applied (list): the versions that were applied (empty if already current)
+    """
+    applied = []
+    for version, path in get_migrations():
+        if version <= schema_version(conn):
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Someone else may have applied it while we waited for the lock.
+            if version > schema_version(conn):
+                for statement in split_statements(path.read_text(encoding="utf-8")):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def init_db() -> list[int]:
+    conn = connect()
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
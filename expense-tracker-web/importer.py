@@ -0,0 +1,238 @@
+import csv
+import io
+import json
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Iterator, TextIO
+
+from validation import clean_expense
+
+BATCH_SIZE = 10_000
+CHUNK_SIZE = 64 * 1024
+# Only the first few failing rows are kept verbatim; every failure is still counted.
+MAX_ERROR_SAMPLES = 50
+
+INSERT_SQL = "INSERT INTO expenses (amount, category, description, created_at) VALUES (?, ?, ?, ?)"
+ROLLUP_UPSERT_SQL = """
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + excluded.count
+"""
+
+# What trg_expenses_version_insert does per row (migration 0006), once for a batch.
+DATA_VERSION_BUMP_SQL = """
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER), changed_at)
+    WHERE id = 1
+"""
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    failed: int = 0
+    errors_by_reason: Counter = field(default_factory=Counter)
+    error_samples: list = field(default_factory=list)
+    # Set when the file itself stops being readable (e.g. broken JSON) part way through.
+    aborted: str = ""
+
+    def add_error(self, row_number: int, reason: str) -> None:
+        self.failed += 1
+        self.errors_by_reason[reason] += 1
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.append((row_number, reason))
+
+    def to_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors_by_reason": dict(self.errors_by_reason),
+            "error_samples": [{"row": n, "reason": r} for n, r in self.error_samples],
+            "aborted": self.aborted,
+        }
+
+
+def iter_csv_records(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    """Yield (row number, record) from a CSV with a header row, e.g. one made by /export.csv."""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        # line_num counts the header too, so numbers match what a spreadsheet shows.
+        yield reader.line_num, record
+
+
+def iter_json_records(stream: TextIO) -> Iterator[tuple[int, object]]:
+    """
+    Yield (position, element) from a top-level JSON array without loading the whole file.
+
+    This is the format the CLI tracker writes to expenses.json. Elements are
+    decoded one at a time as chunks arrive; position counts from 1.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+    count = 0
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        # Skip whitespace and separators, pulling in more text as needed.
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                if buffer[pos] == "," and not started:
+                    raise ValueError("Expected a JSON array of expenses.")
+                pos += 1
+            if pos < len(buffer) or not fill():
+                break
+
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON file.")
+
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array of expenses.")
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError as e:
+                if eof or not fill():
+                    raise ValueError(f"Malformed JSON near element {count + 1}: {e.msg}") from None
+
+        count += 1
+        pos = end
+        yield count, element
+
+
+def to_row(record) -> tuple[float, str, str, str]:
+    """Turn one imported record into an INSERT tuple, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object.")
+
+    amount, category, description = clean_expense(
+        record.get("amount", ""),
+        record.get("category", ""),
+        record.get("description", ""),
+    )
+
+    # CSV exports have created_at; the CLI tracker's JSON has a UTC timestamp.
+    raw_ts = str(record.get("created_at") or record.get("timestamp") or "").strip()
+    if not raw_ts:
+        raise ValueError("Missing created_at/timestamp.")
+    try:
+        dt = datetime.fromisoformat(raw_ts.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError("Invalid created_at/timestamp.") from None
+    if dt.tzinfo is None and len(raw_ts) == 19 and raw_ts[10] == "T":
+        # Already in the stored "YYYY-MM-DDTHH:MM:SS" form (e.g. our own exports).
+        return amount, category, description, raw_ts
+    if dt.tzinfo is not None:
+        # Stored times are naive local time, like add_expense() writes them.
+        dt = dt.astimezone().replace(tzinfo=None)
+
+    return amount, category, description, dt.isoformat(timespec="seconds")
+
+
+def insert_batch(conn: sqlite3.Connection, batch: list) -> None:
+    """
+    Insert one batch of rows and bring expense_rollup up to date, in one transaction.
+
+    The per-row rollup trigger is switched off for the batch (see migration 0003)
+    and replaced by one upsert per (month, category) the batch touches. Rows go
+    in created_at order so the created_at/month indexes are appended to rather
+    than split all over the place.
+    """
+    batch.sort(key=lambda row: row[3])
+
+    deltas = {}
+    for amount, category, _description, created_at in batch:
+        key = (created_at[:7], category)
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + amount, count + 1)
+
+    with conn:
+        conn.execute("UPDATE rollup_control SET deferred = 1 WHERE id = 1")
+        conn.executemany(INSERT_SQL, batch)
+        conn.executemany(
+            ROLLUP_UPSERT_SQL,
+            ((month, category, total, count) for (month, category), (total, count) in deltas.items()),
+        )
+        conn.execute(DATA_VERSION_BUMP_SQL)
+        conn.execute("UPDATE rollup_control SET deferred = 0 WHERE id = 1")
+
+
+def import_records(conn: sqlite3.Connection, records: Iterable[tuple[int, object]],
+                   batch_size: int = BATCH_SIZE) -> ImportReport:
+    """
+    Validate and insert records in batches.
+
+    Each batch is one executemany() inside one transaction, so a big file costs
+    a handful of commits instead of one per row. Bad rows are counted in the
+    report and skipped; they never abort the rest of the file.
+    """
+    report = ImportReport()
+    batch = []
+
+    def flush() -> None:
+        insert_batch(conn, batch)
+        report.inserted += len(batch)
+        batch.clear()
+
+    records = iter(records)
+    while True:
+        try:
+            row_number, record = next(records)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as e:
+            # Rows read so far are still imported; nothing after this point can be.
+            report.aborted = str(e)
+            break
+
+        try:
+            batch.append(to_row(record))
+        except ValueError as e:
+            report.add_error(row_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return report
+
+
+def detect_format(filename: str) -> str:
+    return "json" if filename.lower().endswith(".json") else "csv"
+
+
+def import_file(conn: sqlite3.Connection, stream: TextIO, fmt: str,
+                batch_size: int = BATCH_SIZE) -> ImportReport:
+    records = iter_json_records(stream) if fmt == "json" else iter_csv_records(stream)
+    return import_records(conn, records, batch_size=batch_size)
+
+
+def open_upload(binary_stream) -> TextIO:
+    """Wrap an uploaded (binary) file for text parsing; utf-8-sig drops an Excel BOM."""
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
@@ -0,0 +1,328 @@
+"""
+Opt-in request instrumentation: SQL, pool checkout and template timings.
+
+Off unless app.config["INSTRUMENT"] is set (EXPENSES_INSTRUMENT=1). When it is
+off, init_instrumentation() returns before registering anything, so connections
+are plain sqlite3 connections and no request hooks run.
+
+When it is on:
+  - every statement on a pooled connection is timed and its rows counted
+    (TimedConnection / TimedCursor)
+  - pool checkout and template rendering are timed
+  - each response gets a Server-Timing header (db, checkout, tpl, app)
+  - /debug/metrics shows histograms per route, for SQL, checkout and templates
+  - with INSTRUMENT_PROFILE as well (EXPENSES_PROFILE=1), a sampling profiler watches every request and
+    keeps the stacks of the ones slower than INSTRUMENT_SLOW_MS for /debug/profiles
+"""
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import partial
+from pathlib import Path
+
+from flask import before_render_template, request, template_rendered
+
+import db
+
+# Upper bounds of the histogram buckets, in milliseconds.
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_STATEMENTS_PER_REQUEST = 200
+MAX_PROFILES = 20
+PROFILE_TOP_STACKS = 50
+
+_trace = ContextVar("request_trace", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket the q-th observation falls in."""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in BUCKETS_MS] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name: str, ms: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: h.to_dict() for name, h in sorted(self._histograms.items())}
+
+
+class RequestTrace:
+    __slots__ = ("started", "thread_id", "streamed", "statements", "sql_ms", "checkout_ms",
+                 "template_ms", "template_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.streamed = False
+        self.statements = []
+        self.sql_ms = 0.0
+        self.checkout_ms = 0.0
+        self.template_ms = 0.0
+        self.template_started = None
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Times execute() and every fetch, and counts the rows fetched, into the request's trace."""
+
+    def _start(self, sql: str):
+        trace = _trace.get()
+        self._trace = trace
+        self._statement = None
+        if trace is not None and len(trace.statements) < MAX_STATEMENTS_PER_REQUEST:
+            self._statement = {"sql": " ".join(sql.split()), "ms": 0.0, "rows": 0}
+            trace.statements.append(self._statement)
+
+    def _add(self, started: float, rows: int) -> None:
+        ms = (time.perf_counter() - started) * 1000
+        if self._trace is not None:
+            self._trace.sql_ms += ms
+        if self._statement is not None:
+            self._statement["ms"] += ms
+            self._statement["rows"] += rows
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._add(started, 0)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add(started, max(self.rowcount, 0))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started, 0)
+            raise
+        self._add(started, 1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Sampler:
+    """
+    A background thread that samples the stacks of the threads serving requests.
+
+    Each sample is the thread's current stack, folded into one "a;b;c" line,
+    so a request's samples read like a flame graph in text form. Only the
+    thread that ran the view is sampled; under asgi.py the later chunks of a
+    streamed export run on other pool threads and are not.
+    """
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._active = {}
+        self._thread = None
+
+    def start(self, thread_id: int) -> None:
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: int) -> Counter:
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[fold(frame)] += 1
+
+
+def fold(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+metrics = Metrics()
+profiles = deque(maxlen=MAX_PROFILES)
+
+
+def init_instrumentation(app) -> None:
+    if not app.config.get("INSTRUMENT"):
+        return
+
+    db.HOOKS["connection_factory"] = TimedConnection
+    db.HOOKS["on_checkout"] = _record_checkout
+    sampler = Sampler(app.config.get("INSTRUMENT_PROFILE_INTERVAL_MS", 5)) \
+        if app.config.get("INSTRUMENT_PROFILE") else None
+
+    def finish(trace, endpoint: str, path: str, thread_id: int) -> None:
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        metrics.observe(f"request {endpoint}", total_ms)
+        metrics.observe(f"db {endpoint}", trace.sql_ms)
+        for statement in trace.statements:
+            metrics.observe("sql", statement["ms"])
+        if trace.checkout_ms:
+            metrics.observe("checkout", trace.checkout_ms)
+
+        if sampler:
+            stacks = sampler.stop(thread_id)
+            if total_ms >= app.config.get("INSTRUMENT_SLOW_MS", 500):
+                profiles.append({
+                    "path": path,
+                    "endpoint": endpoint,
+                    "ms": round(total_ms, 1),
+                    "samples": sum(stacks.values()),
+                    "statements": trace.statements,
+                    "stacks": [f"{stack} {n}" for stack, n in stacks.most_common(PROFILE_TOP_STACKS)],
+                })
+
+    @app.before_request
+    def start_trace():
+        trace = RequestTrace()
+        _trace.set(trace)
+        if sampler:
+            sampler.start(trace.thread_id)
+
+    @app.after_request
+    def add_server_timing(response):
+        trace = _trace.get()
+        if trace is None:
+            return response
+        app_ms = (time.perf_counter() - trace.started) * 1000
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={trace.sql_ms:.2f};desc="{len(trace.statements)} statements"',
+            f"checkout;dur={trace.checkout_ms:.2f}",
+            f"tpl;dur={trace.template_ms:.2f}",
+            f"app;dur={app_ms:.2f}",
+        ])
+        if response.is_streamed:
+            # The body (an export) is still to be produced, and teardown can run
+            # before it is; count the request once the server closes the response.
+            trace.streamed = True
+            response.call_on_close(partial(finish, trace, request.endpoint, request.full_path, trace.thread_id))
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc=None):
+        trace = _trace.get()
+        if trace is None or trace.streamed:
+            return
+        _trace.set(None)
+        finish(trace, request.endpoint or "unmatched", request.full_path, trace.thread_id)
+
+    @before_render_template.connect_via(app)
+    def template_started(sender, template, context, **extra):
+        trace = _trace.get()
+        if trace is not None:
+            trace.template_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def template_finished(sender, template, context, **extra):
+        trace = _trace.get()
+        if trace is not None and trace.template_started is not None:
+            ms = (time.perf_counter() - trace.template_started) * 1000
+            trace.template_ms += ms
+            metrics.observe(f"template {template.name}", ms)
+            trace.template_started = None
+
+
+def _record_checkout(ms: float) -> None:
+    trace = _trace.get()
+    if trace is not None:
+        trace.checkout_ms += ms
+
+
+def metrics_snapshot(app) -> dict:
+    return {"enabled": bool(app.config.get("INSTRUMENT")), "histograms": metrics.snapshot()}
+
+
+def profiles_snapshot(app) -> dict:
+    return {"enabled": bool(app.config.get("INSTRUMENT_PROFILE")), "profiles": list(profiles)}
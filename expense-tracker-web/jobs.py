@@ -0,0 +1,182 @@
+"""
+Background jobs for exports and reports that are too slow to run in a request.
+
+A job runs on a small pool of JOB_WORKERS threads in this process, so there
+is no broker or separate worker to run. It writes its result to a file in
+JOB_DIR, which is renamed into place only when the job has finished, and
+the request that started it gets the job's id straight away.
+
+Submitting a job with the same kind and key as one that is still queued or
+running returns that job instead of starting another. More than
+JOB_MAX_QUEUED waiting jobs raise JobsBusy. Finished jobs and their files
+are removed after JOB_KEEP_SECONDS.
+
+Like the result caches, jobs are per process: with several worker processes,
+status and download requests have to reach the process that took the job.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# Job settings, overridable from app.config via init_jobs().
+SETTINGS = {
+    "JOB_WORKERS": 2,
+    "JOB_MAX_QUEUED": 16,
+    "JOB_KEEP_SECONDS": 3600,
+    "JOB_DIR": str(Path(__file__).with_name("jobs")),
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+class JobsBusy(Exception):
+    """Too many jobs are already waiting; the client should retry later."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    key: tuple
+    filename: str
+    mimetype: str
+    path: Path
+    status: str = "queued"  # queued, running, done or failed
+    done: int = 0
+    total: int | None = None
+    error: str | None = None
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+
+    @property
+    def finished_ok(self) -> bool:
+        return self.status == "done"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "filename": self.filename,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_queued: int, keep_seconds: float, directory):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        self.max_queued = max_queued
+        self.keep_seconds = keep_seconds
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.jobs = {}
+        self.in_flight = {}
+        self._lock = threading.Lock()
+        self._remove_old_files()
+
+    def submit(self, kind: str, key: tuple, filename: str, mimetype: str, fn) -> Job:
+        """
+        Queue fn(job, file) to write the result to the open text file.
+
+        fn can set job.total and move job.done on as it goes, for the status
+        endpoint. An identical job still in flight is returned instead.
+        """
+        with self._lock:
+            self._expire()
+            job = self.in_flight.get((kind, key))
+            if job is not None:
+                return job
+            if sum(1 for j in self.in_flight.values() if j.status == "queued") >= self.max_queued:
+                raise JobsBusy
+
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, kind, key, filename, mimetype, self.directory / job_id)
+            self.jobs[job_id] = job
+            self.in_flight[(kind, key)] = job
+        self.executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            self._expire()
+            return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _run(self, job: Job, fn) -> None:
+        job.status = "running"
+        tmp = job.path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="") as file:
+                fn(job, file)
+            os.replace(tmp, job.path)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = "failed"
+            tmp.unlink(missing_ok=True)
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if self.in_flight.get((job.kind, job.key)) is job:
+                    del self.in_flight[(job.kind, job.key)]
+
+    def _expire(self) -> None:
+        # Called with the lock held.
+        cutoff = time.time() - self.keep_seconds
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                job.path.unlink(missing_ok=True)
+                del self.jobs[job_id]
+
+    def _remove_old_files(self) -> None:
+        # Left behind by an earlier run; nothing can ask for them any more.
+        cutoff = time.time() - self.keep_seconds
+        for path in self.directory.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def init_jobs(app) -> None:
+    for key in SETTINGS:
+        if key in app.config:
+            SETTINGS[key] = app.config[key]
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    SETTINGS["JOB_WORKERS"],
+                    SETTINGS["JOB_MAX_QUEUED"],
+                    SETTINGS["JOB_KEEP_SECONDS"],
+                    SETTINGS["JOB_DIR"],
+                )
+    return _queue
+
+
+def _reset_after_fork() -> None:
+    # A forked worker (e.g. gunicorn --preload) makes its own job threads on first use.
+    global _queue, _queue_lock
+    _queue = None
+    _queue_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
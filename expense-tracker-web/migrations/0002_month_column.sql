@@ -0,0 +1,75 @@
+-- Add a stored generated `month` column ("YYYY-MM") so month filters and
+-- groupings can use indexes instead of LIKE / SUBSTR scans.
+--
+-- ALTER TABLE cannot add a STORED generated column, so the table is rebuilt.
+-- The rollup triggers are dropped with the old table and recreated below.
+
+CREATE TABLE expenses_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    amount REAL NOT NULL CHECK(amount >=0),
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    month TEXT GENERATED ALWAYS AS (SUBSTR(created_at, 1, 7)) STORED
+);
+
+INSERT INTO expenses_new (id, amount, category, description, created_at)
+SELECT id, amount, category, description, created_at FROM expenses;
+
+DROP TABLE expenses;
+ALTER TABLE expenses_new RENAME TO expenses;
+
+-- Newest-first listing and keyset pagination (the index carries the rowid).
+CREATE INDEX idx_expenses_created_at ON expenses(created_at);
+-- Month-filtered pages, already in created_at order.
+CREATE INDEX idx_expenses_month_created_at ON expenses(month, created_at);
+-- Category-filtered pages. No trailing amount column: the rowid has to follow
+-- created_at directly for ORDER BY created_at, id to come straight off the index.
+CREATE INDEX idx_expenses_category_created_at ON expenses(category, created_at);
+-- Covers GROUP BY month, category (rollup rebuild/check) and month + category filters.
+CREATE INDEX idx_expenses_month_category_amount ON expenses(month, category, amount);
+
+CREATE TRIGGER trg_expenses_rollup_insert
+AFTER INSERT ON expenses
+BEGIN
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (NEW.month, NEW.category, NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + 1;
+END;
+
+CREATE TRIGGER trg_expenses_rollup_delete
+AFTER DELETE ON expenses
+BEGIN
+    UPDATE expense_rollup
+    SET total = total - OLD.amount, count = count - 1
+    WHERE month = OLD.month AND category = OLD.category;
+
+    DELETE FROM expense_rollup
+    WHERE month = OLD.month AND category = OLD.category AND count <= 0;
+END;
+
+CREATE TRIGGER trg_expenses_rollup_update
+AFTER UPDATE OF amount, category, created_at ON expenses
+BEGIN
+    UPDATE expense_rollup
+    SET total = total - OLD.amount, count = count - 1
+    WHERE month = OLD.month AND category = OLD.category;
+
+    DELETE FROM expense_rollup
+    WHERE month = OLD.month AND category = OLD.category AND count <= 0;
+
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (NEW.month, NEW.category, NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + 1;
+END;
+
+-- Recompute the rollup, which also backfills databases that predate it.
+DELETE FROM expense_rollup;
+INSERT INTO expense_rollup (month, category, total, count)
+SELECT month, category, SUM(amount), COUNT(*)
+FROM expenses
+GROUP BY month, category;
@@ -0,0 +1,25 @@
+-- Let bulk imports switch off the per-row rollup trigger and apply one
+-- pre-aggregated update per (month, category) instead.
+--
+-- importer.py sets deferred = 1 and back to 0 inside the same transaction as
+-- its inserts, so no other connection ever sees it set.
+
+CREATE TABLE rollup_control (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    deferred INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO rollup_control (id, deferred) VALUES (1, 0);
+
+DROP TRIGGER trg_expenses_rollup_insert;
+
+CREATE TRIGGER trg_expenses_rollup_insert
+AFTER INSERT ON expenses
+WHEN (SELECT deferred FROM rollup_control WHERE id = 1) = 0
+BEGIN
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (NEW.month, NEW.category, NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + 1;
+END;
@@ -0,0 +1,44 @@
+-- Full-text search over description and category (search.py).
+--
+-- An external-content FTS5 table: it stores only the index and reads the
+-- text back from expenses, so the descriptions aren't kept twice. The
+-- triggers below keep it in step with every insert, update and delete.
+--
+-- unicode61 folds case and accents ("cafe" finds "Café"); prefix='2 3' adds
+-- indexes for 2- and 3-character prefixes, the ones that would otherwise
+-- match the most terms.
+
+CREATE VIRTUAL TABLE expenses_fts USING fts5(
+    description,
+    category,
+    content = 'expenses',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER trg_expenses_fts_insert
+AFTER INSERT ON expenses
+BEGIN
+    INSERT INTO expenses_fts (rowid, description, category)
+    VALUES (NEW.id, NEW.description, NEW.category);
+END;
+
+CREATE TRIGGER trg_expenses_fts_delete
+AFTER DELETE ON expenses
+BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+    VALUES ('delete', OLD.id, OLD.description, OLD.category);
+END;
+
+CREATE TRIGGER trg_expenses_fts_update
+AFTER UPDATE OF description, category ON expenses
+BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+    VALUES ('delete', OLD.id, OLD.description, OLD.category);
+    INSERT INTO expenses_fts (rowid, description, category)
+    VALUES (NEW.id, NEW.description, NEW.category);
+END;
+
+-- Index the expenses that are already there.
+INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild');
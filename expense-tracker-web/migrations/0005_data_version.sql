@@ -0,0 +1,46 @@
+-- A change counter for expenses, for the web app's ETags and Last-Modified
+-- (cache.DataVersion).
+--
+-- The triggers bump it on every insert, update and delete, so writes made by
+-- any process (another worker, the CLI's sqlite ledger) move it on. changed_at
+-- is in whole seconds, like HTTP dates: the next second after the change, and
+-- at least one second after the previous change, so every version has its
+-- own Last-Modified. Bulk imports switch the insert trigger off with
+-- rollup_control (see 0003) and bump the counter once per batch instead.
+
+CREATE TABLE data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    changed_at INTEGER NOT NULL
+);
+
+INSERT INTO data_version (id, version, changed_at)
+VALUES (1, 0, CAST(strftime('%s', 'now') AS INTEGER) + 1);
+
+CREATE TRIGGER trg_expenses_version_insert
+AFTER INSERT ON expenses
+WHEN (SELECT deferred FROM rollup_control WHERE id = 1) = 0
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER) + 1, changed_at + 1)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_expenses_version_update
+AFTER UPDATE ON expenses
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER) + 1, changed_at + 1)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_expenses_version_delete
+AFTER DELETE ON expenses
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER) + 1, changed_at + 1)
+    WHERE id = 1;
+END;
@@ -0,0 +1,44 @@
+-- changed_at keeps the real time of the last change (see 0005).
+--
+-- 0005 moved it at least one second on per change, so a burst of writes (or
+-- a big import) pushed Last-Modified minutes or hours into the future. Now
+-- it is the second of the change, and never goes backwards. Changes in the
+-- same second share it and only differ in the version, which is in the ETag;
+-- cache.DataVersion leaves Last-Modified off while that second is still
+-- running, so no client gets a date that a later change could share.
+
+UPDATE data_version
+SET changed_at = MIN(changed_at, CAST(strftime('%s', 'now') AS INTEGER))
+WHERE id = 1;
+
+DROP TRIGGER trg_expenses_version_insert;
+DROP TRIGGER trg_expenses_version_update;
+DROP TRIGGER trg_expenses_version_delete;
+
+CREATE TRIGGER trg_expenses_version_insert
+AFTER INSERT ON expenses
+WHEN (SELECT deferred FROM rollup_control WHERE id = 1) = 0
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER), changed_at)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_expenses_version_update
+AFTER UPDATE ON expenses
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER), changed_at)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER trg_expenses_version_delete
+AFTER DELETE ON expenses
+BEGIN
+    UPDATE data_version SET
+        version = version + 1,
+        changed_at = MAX(CAST(strftime('%s', 'now') AS INTEGER), changed_at)
+    WHERE id = 1;
+END;
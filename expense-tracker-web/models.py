@@ -1,18 +1,41 @@
+from dataclasses import dataclass
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+
+from auth import hash_password, verify_password
 
 db = SQLAlchemy()
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
-    id = db.Column(db.Integar, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)
 
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
 
     def set_password(self, raw_password: str) -> None:
-        self.password_hash = generate_password_hash(raw_password)
+        self.password_hash = hash_password(raw_password)
 
     def  check_password(self, raw_password: str) -> bool:
-        return check_password_hash(self.password_hash, raw_password)
+        ok, new_hash = verify_password(self.password_hash, raw_password)
+        if new_hash:
+            # Hashed with older settings: upgrade it now that we have the password.
+            self.password_hash = new_hash
+        return ok
+
+    def session_user(self) -> "SessionUser":
+        return SessionUser(id=self.id, email=self.email)
+
+
+@dataclass(frozen=True)
+class SessionUser(UserMixin):
+    """
+    What a request needs to know about the logged-in user.
+
+    load_user() caches these rather than User rows: they are plain immutable
+    values, so one can be shared between threads and requests without a
+    database session.
+    """
+    id: int
+    email: str
@@ -0,0 +1,102 @@
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's timeout."""
+
+
+class ConnectionPool:
+    """
+    A small, thread-safe pool of SQLite connections.
+
+    At most `size` connections are checked out at once; callers past that wait
+    (up to `timeout` seconds) for one to be released. Connections are created
+    lazily through `factory` and reused most-recently-released first, so a quiet
+    app only ever keeps the connections it actually needed open.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], size: int = 8, timeout: float = 10.0):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        waited = 0.0
+        if not self._slots.acquire(blocking=False):
+            started = time.perf_counter()
+            got_slot = self._slots.acquire(timeout=self.timeout)
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._waits += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                if not got_slot:
+                    self._timeouts += 1
+            if not got_slot:
+                raise PoolTimeout(f"No database connection available after {self.timeout:.1f}s")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self.factory()
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self._created += 1
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        # Never hand the next request someone else's half-finished transaction.
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def close(self) -> None:
+        """Close every idle connection, e.g. at shutdown or after a fork."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+                "wait_ms_avg": round(self._wait_total * 1000 / self._waits, 3) if self._waits else 0.0,
+            }
@@ -0,0 +1,67 @@
+"""
+Query-plan check for the hot routes: `flask check-query-plans` and tests/test_query_plans.py.
+
+hot_queries() runs the routes in-process as a logged-in user and records the
+SELECTs they send to the expenses database; plan_problems() reads the
+EXPLAIN QUERY PLAN of one of them.
+"""
+from flask import current_app, url_for
+from flask_login import login_user
+
+from db import get_conn
+
+
+def plan_problems(conn, sql: str) -> list[str]:
+    """EXPLAIN QUERY PLAN lines that read expenses without an index (empty list = fine)."""
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        detail = row["detail"]
+        if detail.startswith("SCAN expenses") and "INDEX" not in detail:
+            problems.append(detail)
+    return problems
+
+
+def hot_queries(user) -> list[str]:
+    """
+    Every distinct SELECT the hot routes run, for each kind of filter.
+
+    Runs /, /stats, /api/stats and /export.csv (and a later index page) as
+    `user` with no filter, a category, a month, both, and searches, taking
+    the values from the data. Empty when there are no expenses to take them
+    from.
+    """
+    with get_conn() as conn:
+        sample = conn.execute("SELECT month, category FROM expense_rollup LIMIT 1").fetchone()
+        if sample is None:
+            return []
+        word = conn.execute("SELECT description FROM expenses LIMIT 1").fetchone()["description"].split()[0]
+
+    filter_sets = [{}, {"category": sample["category"]}, {"month": sample["month"]},
+                   {"category": sample["category"], "month": sample["month"]},
+                   {"q": word[:3]}, {"q": word, "category": sample["category"], "month": sample["month"]}]
+    urls = []
+    for filters in filter_sets:
+        urls += [_url("expenses.index", filters), _url("expenses.stats", filters),
+                 _url("expenses.api_stats", filters), _url("expenses.export_csv", filters)]
+        # A later page exercises the keyset cursor condition.
+        cursor = "-1e308" if filters.get("q") else "9999-12-31T00:00:00"
+        urls.append(_url("expenses.index", dict(filters, after=f"{cursor},{2**62}", per_page=5)))
+
+    statements = []
+    for url in urls:
+        with current_app.test_request_context(url):
+            login_user(user)
+            conn = get_conn()
+            conn.set_trace_callback(statements.append)
+            try:
+                response = current_app.full_dispatch_request()
+                for _ in response.response:  # drain streamed bodies
+                    pass
+            finally:
+                conn.set_trace_callback(None)
+    return list(dict.fromkeys(s for s in statements if s.lstrip().upper().startswith("SELECT")))
+
+
+def _url(endpoint: str, params: dict) -> str:
+    with current_app.test_request_context():
+        return url_for(endpoint, **params)
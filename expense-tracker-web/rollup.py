@@ -0,0 +1,43 @@
+import sqlite3
+
+# How far a running total may drift from the real sum before --check reports it.
+TOLERANCE = 0.005
+
+ACTUAL_SQL = """
+    SELECT month, category,
+           SUM(amount) AS total, COUNT(*) AS count
+    FROM expenses
+    GROUP BY month, category
+"""
+
+def rebuild_rollup(conn: sqlite3.Connection) -> int:
+    """Recompute expense_rollup from scratch. Returns the number of (month, category) groups."""
+    with conn:
+        conn.execute("DELETE FROM expense_rollup")
+        conn.execute(
+            "INSERT INTO expense_rollup (month, category, total, count) " + ACTUAL_SQL
+        )
+    return conn.execute("SELECT COUNT(*) FROM expense_rollup").fetchone()[0]
+
+def check_rollup(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Compare expense_rollup against a fresh GROUP BY over expenses.
+
+    Returns a list of (month, category, rollup_total, actual_total, rollup_count, actual_count)
+    for every group that disagrees; an empty list means the rollup is consistent.
+    """
+    actual = {
+        (r[0], r[1]): (r[2], r[3]) for r in conn.execute(ACTUAL_SQL)
+    }
+    stored = {
+        (r[0], r[1]): (r[2], r[3])
+        for r in conn.execute("SELECT month, category, total, count FROM expense_rollup")
+    }
+
+    mismatches = []
+    for key in sorted(actual.keys() | stored.keys()):
+        stored_total, stored_count = stored.get(key, (0.0, 0))
+        actual_total, actual_count = actual.get(key, (0.0, 0))
+        if stored_count != actual_count or abs(stored_total - actual_total) > TOLERANCE:
+            mismatches.append((*key, stored_total, actual_total, stored_count, actual_count))
+    return mismatches
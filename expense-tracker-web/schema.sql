@@ -1,3 +1,6 @@
+-- Version 1 of the schema. Later changes are numbered files in migrations/,
+-- applied in order by db.init_db() (tracked with PRAGMA user_version).
+
 CREATE TABLE IF NOT EXISTS expenses (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     amount REAL NOT NULL CHECK(amount >=0),
@@ -7,4 +10,54 @@ CREATE TABLE IF NOT EXISTS expenses (
 );
 
 CREATE INDEX IF NOT EXISTS idx_expenses_created_at ON expenses(created_at);
-CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+
+-- Running totals per (month, category), kept up to date by the triggers below
+-- so /stats and the index total never have to scan expenses.
+CREATE TABLE IF NOT EXISTS expense_rollup (
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, category)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_expense_rollup_category ON expense_rollup(category, month);
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert
+AFTER INSERT ON expenses
+BEGIN
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (SUBSTR(NEW.created_at, 1, 7), NEW.category, NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete
+AFTER DELETE ON expenses
+BEGIN
+    UPDATE expense_rollup
+    SET total = total - OLD.amount, count = count - 1
+    WHERE month = SUBSTR(OLD.created_at, 1, 7) AND category = OLD.category;
+
+    DELETE FROM expense_rollup
+    WHERE month = SUBSTR(OLD.created_at, 1, 7) AND category = OLD.category AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+AFTER UPDATE OF amount, category, created_at ON expenses
+BEGIN
+    UPDATE expense_rollup
+    SET total = total - OLD.amount, count = count - 1
+    WHERE month = SUBSTR(OLD.created_at, 1, 7) AND category = OLD.category;
+
+    DELETE FROM expense_rollup
+    WHERE month = SUBSTR(OLD.created_at, 1, 7) AND category = OLD.category AND count <= 0;
+
+    INSERT INTO expense_rollup (month, category, total, count)
+    VALUES (SUBSTR(NEW.created_at, 1, 7), NEW.category, NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + 1;
+END;
@@ -0,0 +1,47 @@
+import re
+import sqlite3
+
+# Longest search the filters accept; anything after this is ignored.
+MAX_QUERY_LENGTH = 100
+
+TERM_RE = re.compile(r"\w+")
+
+# Expenses whose description or category match (for WHERE clauses on expenses).
+MATCH_IDS_SQL = "id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)"
+
+# Matching expenses with their bm25 score as `rank` (lower is a better match).
+# Wrapped in a subquery so "category = ?" / "month = ?" filters can go after it unqualified.
+RANKED_SQL = """
+    SELECT * FROM (
+        SELECT expenses.*, bm25(expenses_fts) AS rank
+        FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+        WHERE expenses_fts MATCH ?
+    )
+"""
+
+def match_query(text: str) -> str:
+    """
+    Turn what the user typed into an FTS5 MATCH expression.
+
+    Every word has to match, as a prefix ("coff sta" finds "Coffee at Starbucks").
+    Only the words are kept, so quotes, *, -, OR, NEAR and other FTS5 syntax in
+    the input are searched for as plain text rather than breaking the query.
+
+    Returns "" if there is nothing to search for.
+    """
+    return " ".join(f'"{term}"*' for term in TERM_RE.findall(text[:MAX_QUERY_LENGTH]))
+
+def search(conn: sqlite3.Connection, text: str, limit: int = 50, where_sql: str = "", params=()) -> list:
+    """
+    The best `limit` matches for text, best first (ties newest first).
+
+    where_sql/params can narrow it further with category and month filters
+    (build_where_sql in app.py, without a search term).
+    """
+    match = match_query(text)
+    if not match:
+        return []
+    return conn.execute(
+        RANKED_SQL + where_sql + " ORDER BY rank, id DESC LIMIT ?",
+        (match, *params, limit),
+    ).fetchall()
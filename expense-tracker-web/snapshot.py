@@ -0,0 +1,331 @@
+"""
+A read-only binary snapshot of the expenses, for fast cold starts.
+
+The file is a header followed by fixed-width column arrays, so it can be
+mmap'ed and used in place: memoryviews (or NumPy arrays over the same
+memory) with no parsing at all. Every number is little-endian and every
+section starts on an 8-byte boundary.
+
+    header      MAGIC, version, id width, rows, categories, source stamp
+    directory   (offset, length) of each section in SECTIONS order
+    amounts     float64 per row
+    timestamps  int64 microseconds since the epoch (NO_TIME if unparseable)
+    months      int32 month ordinals as in analytics.py (NO_MONTH if none)
+    categories  int32 codes into the category names
+    ids         ID_WIDTH bytes per row, UTF-8 padded with NUL
+
+Descriptions, the original timestamp text and the category names are string
+tables: uint64 offsets (one more than there are strings) into a UTF-8 blob.
+
+A snapshot records a stamp of the files it was made from (see source_stamp()),
+so a reader can tell when it is out of date and needs writing again.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import datetime
+from pathlib import Path
+
+from analytics import NO_MONTH, ExpenseColumns, month_ordinal
+
+MAGIC = b"EXPSNAP\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+
+# Wide enough for the CLI's UUIDs and the database's integer ids.
+ID_WIDTH = 36
+NO_TIME = -(2 ** 63)
+
+SECTIONS = (
+    "amounts", "timestamps", "months", "categories", "ids",
+    "description_offsets", "descriptions",
+    "timestamp_text_offsets", "timestamp_texts",
+    "category_name_offsets", "category_names",
+)
+STAMP_OFFSET = HEADER.size - 8
+DIRECTORY = struct.Struct("<" + "QQ" * len(SECTIONS))
+DATA_START = HEADER.size + DIRECTORY.size
+
+# array typecodes and NumPy dtypes of the fixed-width columns.
+TYPECODES = {"amounts": "d", "timestamps": "q", "months": "i", "categories": "i"}
+DTYPES = {"amounts": "<f8", "timestamps": "<i8", "months": "<i4", "categories": "<i4"}
+
+# Rows buffered in memory per column before they are written out.
+BATCH_SIZE = 65536
+
+
+class SnapshotError(Exception):
+    """The file isn't a snapshot this version can read."""
+
+
+def _check_byte_order():
+    # The columns are written and read in place as native arrays.
+    if sys.byteorder != "little":
+        raise SnapshotError("snapshots can only be used on little-endian machines")
+
+
+def source_stamp(*paths) -> int:
+    """A 64-bit stamp of the files' sizes and modification times (missing files count too)."""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        try:
+            st = os.stat(path)
+            digest.update(f"{path}:{st.st_mtime_ns}:{st.st_size};".encode())
+        except FileNotFoundError:
+            digest.update(f"{path}:missing;".encode())
+    return int.from_bytes(digest.digest(), "little")
+
+
+def parse_time(timestamp: str):
+    """(microseconds since the epoch, month ordinal) for a stored timestamp."""
+    if not timestamp:
+        return NO_TIME, NO_MONTH
+    try:
+        # Naive timestamps (the database's created_at) are local time, as everywhere else.
+        when = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return NO_TIME, NO_MONTH
+    seconds = when.timestamp()
+    return round(seconds * 1_000_000), month_ordinal(timestamp[:7])
+
+
+class _StringWriter:
+    """Writes one string table: offsets and data go to separate temp files."""
+
+    def __init__(self):
+        self.offsets = tempfile.TemporaryFile()
+        self.data = tempfile.TemporaryFile()
+        self.size = 0
+        self.pending = array("Q", [0])
+
+    def add(self, text: str) -> None:
+        encoded = text.encode("utf-8")
+        self.data.write(encoded)
+        self.size += len(encoded)
+        self.pending.append(self.size)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.pending.tofile(self.offsets)
+        self.pending = array("Q")
+
+
+def write_snapshot(path, records, stamp: int = 0) -> int:
+    """
+    Write records to a snapshot file at path, replacing it atomically.
+
+    records is any iterable of (id, amount, category, description, timestamp)
+    and is read once, with only a batch of rows in memory, so it can stream
+    from a file or a cursor. Returns the number of rows written.
+    """
+    _check_byte_order()
+    numbers = {name: array(code) for name, code in TYPECODES.items()}
+    files = {name: tempfile.TemporaryFile() for name in (*TYPECODES, "ids")}
+    ids = bytearray()
+    descriptions, timestamp_texts, category_names = _StringWriter(), _StringWriter(), _StringWriter()
+    codes = {}
+    rows = 0
+
+    def flush():
+        nonlocal ids
+        for name, values in numbers.items():
+            values.tofile(files[name])
+            del values[:]
+        files["ids"].write(ids)
+        ids = bytearray()
+
+    for expense_id, amount, category, description, timestamp in records:
+        encoded_id = str(expense_id).encode("utf-8")
+        if len(encoded_id) > ID_WIDTH:
+            raise ValueError(f"id {expense_id!r} is longer than {ID_WIDTH} bytes")
+        ids += encoded_id.ljust(ID_WIDTH, b"\x00")
+
+        code = codes.get(category)
+        if code is None:
+            code = codes[category] = len(codes)
+            category_names.add(category)
+        micros, month = parse_time(timestamp)
+        numbers["amounts"].append(amount)
+        numbers["timestamps"].append(micros)
+        numbers["months"].append(month)
+        numbers["categories"].append(code)
+        descriptions.add(description)
+        timestamp_texts.add(timestamp)
+
+        rows += 1
+        if rows % BATCH_SIZE == 0:
+            flush()
+    flush()
+    for strings in (descriptions, timestamp_texts, category_names):
+        strings.flush()
+
+    sources = {
+        **files,
+        "description_offsets": descriptions.offsets, "descriptions": descriptions.data,
+        "timestamp_text_offsets": timestamp_texts.offsets, "timestamp_texts": timestamp_texts.data,
+        "category_name_offsets": category_names.offsets, "category_names": category_names.data,
+    }
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(b"\x00" * DATA_START)
+        directory = []
+        for name in SECTIONS:
+            out.write(b"\x00" * (-out.tell() % 8))
+            start = out.tell()
+            source = sources[name]
+            source.seek(0)
+            shutil.copyfileobj(source, out)
+            source.close()
+            directory += [start, out.tell() - start]
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, ID_WIDTH, rows, len(codes), stamp))
+        out.write(DIRECTORY.pack(*directory))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return rows
+
+
+class StringTable:
+    """Strings decoded one at a time from a table in the mapped file."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class Snapshot:
+    """
+    A snapshot file opened through mmap.
+
+    amounts, timestamps, months and categories are memoryviews straight onto
+    the file; array(name) gives the same memory as a NumPy array. Nothing is
+    read from disk until it is touched.
+    """
+
+    def __init__(self, path):
+        _check_byte_order()
+        self.path = Path(path)
+        with open(path, "rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"{path} is empty") from None
+        if len(self._map) < DATA_START:
+            self._map.close()
+            raise SnapshotError(f"{path} is too short to be a snapshot")
+
+        magic, version, self.id_width, self.rows, n_categories, self.stamp = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise SnapshotError(f"{path} is not a version {VERSION} expense snapshot")
+        directory = DIRECTORY.unpack_from(self._map, HEADER.size)
+        self.sections = {name: directory[2 * i:2 * i + 2] for i, name in enumerate(SECTIONS)}
+
+        self._view = memoryview(self._map)
+        for name, code in TYPECODES.items():
+            setattr(self, name, self._section(name).cast(code))
+        self.ids = self._section("ids")
+        self.descriptions = self._strings("description_offsets", "descriptions")
+        self.timestamp_texts = self._strings("timestamp_text_offsets", "timestamp_texts")
+        # Few enough to decode up front.
+        category_names = self._strings("category_name_offsets", "category_names")
+        self.category_names = [category_names[i] for i in range(n_categories)]
+
+    def _section(self, name):
+        offset, length = self.sections[name]
+        return self._view[offset:offset + length]
+
+    def _strings(self, offsets, data):
+        return StringTable(self._section(offsets).cast("Q"), self._section(data))
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_current(self, stamp: int) -> bool:
+        return self.stamp == stamp
+
+    def id(self, i: int) -> str:
+        start = i * self.id_width
+        return str(self.ids[start:start + self.id_width], "utf-8").rstrip("\x00")
+
+    def row(self, i: int):
+        """(id, amount, category, description, timestamp) as it was written."""
+        return (
+            self.id(i),
+            self.amounts[i],
+            self.category_names[self.categories[i]],
+            self.descriptions[i],
+            self.timestamp_texts[i],
+        )
+
+    def array(self, name):
+        """A NumPy view of a fixed-width column (ids come out as bytes of id_width)."""
+        import numpy as np
+
+        offset = self.sections[name][0]
+        dtype = DTYPES.get(name, f"S{self.id_width}")
+        return np.frombuffer(self._map, dtype=dtype, count=self.rows, offset=offset)
+
+    def columns(self) -> ExpenseColumns:
+        """The analytics columns, without copying anything."""
+        return ExpenseColumns(
+            self.array("amounts"), self.array("months"), self.array("categories"), list(self.category_names)
+        )
+
+    def close(self) -> None:
+        for name in (*TYPECODES, "ids"):
+            getattr(self, name).release()
+        for strings in (self.descriptions, self.timestamp_texts):
+            strings.offsets.release()
+            strings.data.release()
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # NumPy arrays from array() still point into the map; it closes when they go.
+            pass
+
+
+def set_stamp(path, stamp: int) -> None:
+    """Record the source stamp of an already written snapshot."""
+    with open(path, "r+b") as file:
+        file.seek(STAMP_OFFSET)
+        file.write(struct.pack("<Q", stamp))
+
+
+def write_from_db(conn, path) -> int:
+    """
+    Snapshot every row of the expenses table, oldest id first.
+
+    The stamp is left for the caller to set with set_stamp(path, db_stamp(...))
+    once conn is closed, because closing the last connection checkpoints the
+    WAL and so changes the files the stamp is taken from.
+    """
+    rows = conn.execute("SELECT id, amount, category, description, created_at FROM expenses ORDER BY id")
+    return write_snapshot(path, rows)
+
+
+def db_stamp(db_path) -> int:
+    """source_stamp() of a database file and its WAL, which is where recent writes are."""
+    return source_stamp(db_path, f"{db_path}-wal")
@@ -0,0 +1,60 @@
+"""
+Template caching: rendered fragments in memory, compiled templates on disk.
+
+{% cache key %}...{% endcache %} renders its body once per key and reuses
+the HTML until the key is dropped. The key is a (name, category, month, ...)
+tuple like the result cache's, and the fragments live in a ResultCache, so
+expenses_changed() drops exactly the fragments a write touches. Views pass
+fragment_generation (the cache's generation before they loaded their data)
+so a render of data a write has since changed is never stored.
+
+Compiled templates are kept in TEMPLATE_CACHE_DIR (Jinja's
+FileSystemBytecodeCache), so a fresh worker loads bytecode instead of
+compiling every template again. An edited template has a different checksum
+and is compiled as usual.
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Set to a ResultCache by init_templates(); None renders every time.
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_cached", [nodes.ContextReference(), key])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached(self, context, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        html = cache.lookup(key)
+        if html is None:
+            # Taken by the view before it loaded the data, if it passed one, so
+            # a write in between keeps this render out of the cache.
+            generation = context.get("fragment_generation")
+            if generation is None:
+                generation = cache.generation()
+            html = caller()
+            cache.put(key, html, generation)
+        return html
+
+
+def init_templates(app, fragment_cache) -> None:
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = fragment_cache
+
+    directory = app.config.get("TEMPLATE_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
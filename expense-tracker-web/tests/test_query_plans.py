@@ -0,0 +1,80 @@
+"""
+The hot routes' queries must read expenses through an index, never a full scan.
+
+Seeds a scratch database (EXPENSES_DB) with a few months and categories,
+runs every hot route for each kind of filter as a registered user
+(query_plans.hot_queries()) and checks the EXPLAIN QUERY PLAN of each SELECT
+they issued.
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+CATEGORIES = ["food", "rent", "travel", "utilities", "fun"]
+
+
+@pytest.fixture(scope="module")
+def flask_app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("query-plans")
+    with pytest.MonkeyPatch.context() as mp:
+        # db.py reads EXPENSES_DB at import, so set it before the app is imported.
+        mp.setenv("EXPENSES_DB", str(tmp / "expenses.db"))
+        mp.setenv("EXPENSES_USERS_DB", f"sqlite:///{tmp / 'users.db'}")
+        mp.setenv("EXPENSES_TEMPLATE_CACHE", str(tmp / "jinja"))
+        mp.setenv("EXPENSES_JOB_DIR", str(tmp / "jobs"))
+        mp.syspath_prepend(str(APP_DIR))
+        for name in ("app", "db", "query_plans"):
+            sys.modules.pop(name, None)
+        from app import create_app, prepare_schema
+        from db import get_conn
+        from importer import insert_batch
+
+        app = create_app()
+        rng = random.Random(1)
+        start = datetime(2024, 1, 1)
+        rows = [
+            (round(rng.uniform(1, 100), 2), rng.choice(CATEGORIES), f"coffee {i} with friends",
+             (start + timedelta(hours=rng.randrange(24 * 365))).isoformat(timespec="seconds"))
+            for i in range(2000)
+        ]
+        with app.app_context():
+            prepare_schema()
+            insert_batch(get_conn(), rows)
+        yield app
+
+
+@pytest.fixture(scope="module")
+def user(flask_app):
+    from models import User, db
+
+    with flask_app.app_context():
+        row = User(email="plans@example.com")
+        row.set_password("query plans")
+        db.session.add(row)
+        db.session.commit()
+        return row.session_user()
+
+
+def test_plan_problems_flags_a_table_scan(flask_app):
+    from query_plans import plan_problems
+    from db import get_conn
+
+    with flask_app.app_context():
+        assert plan_problems(get_conn(), "SELECT * FROM expenses WHERE description LIKE '%coffee%'")
+
+
+def test_hot_queries_use_an_index(flask_app, user):
+    from query_plans import hot_queries, plan_problems
+    from db import get_conn
+
+    with flask_app.app_context():
+        queries = hot_queries(user)
+        assert not flask_app.config.get("LOGIN_DISABLED")
+        assert queries, "the routes ran no queries"
+        conn = get_conn()
+        scans = {" ".join(sql.split()): plan_problems(conn, sql) for sql in queries}
+    assert {sql: problems for sql, problems in scans.items() if problems} == {}
@@ -0,0 +1,26 @@
+import math
+
+
+def clean_expense(amount_raw: str, category: str, description: str) -> tuple[float, str, str]:
+    """
+    Validate the fields of one expense, the same way for the forms and for imports.
+
+    Returns (amount, category, description) stripped and converted, or raises
+    ValueError with a message that can be shown to the user.
+    """
+    # A JSON null or a short CSV row gives None; treat it as missing, not as "None".
+    amount_raw = str("" if amount_raw is None else amount_raw).strip()
+    category = str("" if category is None else category).strip()
+    description = str("" if description is None else description).strip()
+
+    try:
+        amount = float(amount_raw)
+        if not math.isfinite(amount) or amount < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError("Amount must be a number ≥ 0.") from None
+
+    if not category or not description:
+        raise ValueError("Category and description are required.")
+
+    return amount, category, description
@@ -0,0 +1,91 @@
+"""
+ID lookup: the old linear prefix scan vs IdPrefixIndex.
+
+Usage:
+    python benchmarks/bench_id_index.py            # 1,000,000 records
+    python benchmarks/bench_id_index.py --records 200000 --lookups 2000
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from id_index import IdPrefixIndex  # noqa: E402
+from records import Expense  # noqa: E402
+
+
+def linear_find(expenses, user_input: str):
+    """The lookup the CLI used before the index (find_expense_index_by_id_prefix)."""
+    prefix = user_input.strip().lower()
+    if not prefix:
+        return None
+
+    matches = []
+    for i, e in enumerate(expenses):
+        exp_id = e.id.lower()
+        if exp_id.startswith(prefix):
+            matches.append(i)
+
+    if len(matches) == 1:
+        return matches[0]
+
+    return None
+
+
+def _expense():
+    return Expense(id=str(uuid.uuid4()), amount=1.0, category="", description="", timestamp="")
+
+
+def timed(fn, *args):
+    # Like timeit, keep the collector out of it: with millions of live records a
+    # single full collection would swamp the microseconds being measured.
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--linear-lookups", type=int, default=20, help="The old scan is slow; sample fewer.")
+    args = parser.parse_args()
+
+    expenses = [_expense() for _ in range(args.records)]
+    samples = random.sample(expenses, args.lookups)
+
+    index, build = timed(IdPrefixIndex, expenses)
+    print(f"{args.records:,} records")
+    print(f"build index:          {build * 1000:10.1f} ms")
+
+    _, short_total = timed(lambda: [index.short_id(e) for e in samples])
+    prefixes = [index.short_id(e) for e in samples]
+    print(f"short_id:             {short_total / args.lookups * 1e6:10.2f} µs/record "
+          f"(avg length {sum(map(len, prefixes)) / len(prefixes):.1f} chars)")
+
+    _, indexed = timed(lambda: [index.resolve(p) for p in prefixes])
+    print(f"indexed lookup:       {indexed / args.lookups * 1e6:10.2f} µs/lookup")
+
+    linear_prefixes = [e.id[:8] for e in samples[:args.linear_lookups]]
+    _, linear = timed(lambda: [linear_find(expenses, p) for p in linear_prefixes])
+    print(f"linear scan lookup:   {linear / len(linear_prefixes) * 1e6:10.2f} µs/lookup")
+
+    extra = _expense()
+    _, add = timed(index.add, extra)
+    _, remove = timed(index.remove, extra)
+    print(f"add / remove:         {add * 1e6:10.2f} / {remove * 1e6:.2f} µs")
+
+    assert all(index.resolve(p)[0] is e for p, e in zip(prefixes, samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+CLI reporting on plain dicts (parsing timestamps per view) vs pre-parsed Expense records.
+
+Each round runs what the menu does: list everything, filter by month,
+monthly totals and category totals. Dicts re-parse every timestamp in every
+view; records parse once at load and reuse their formatted display string.
+
+Usage:
+    python benchmarks/bench_records.py            # 500,000 records, 3 rounds
+    python benchmarks/bench_records.py --records 100000 --rounds 5
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from records import Expense  # noqa: E402
+
+CATEGORIES = ["Food", "Transport", "Bills", "Fun", "Shopping", "Health", "Gifts"]
+
+
+def make_file(path, n):
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "amount": round(random.uniform(1, 200), 2),
+            "category": random.choice(CATEGORIES),
+            "description": "benchmark",
+            "timestamp": (start + timedelta(seconds=random.randrange(4 * 365 * 86400))).isoformat(),
+        }
+        for _ in range(n)
+    ]
+    with open(path, "w") as file:
+        json.dump(rows, file)
+
+
+# The per-view parsing the CLI did before records.py.
+def _format_dict(ts):
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone().strftime("%d-%m-%Y %H:%M")
+    except Exception:
+        return ts
+
+
+def _month_dict(ts):
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).strftime("%Y-%m")
+    except ValueError:
+        return None
+
+
+def dict_round(expenses, month):
+    listed = [
+        f"£{float(e['amount']):.2f} - {e['category']} - {e['description']} - {_format_dict(e['timestamp'])}"
+        for e in sorted(expenses, key=lambda e: e["timestamp"], reverse=True)
+    ]
+    in_month = [e for e in expenses if _month_dict(e["timestamp"]) == month]
+    by_month, by_category = {}, {}
+    for e in expenses:
+        m = _month_dict(e["timestamp"])
+        by_month[m] = by_month.get(m, 0.0) + float(e["amount"])
+        by_category[e["category"]] = by_category.get(e["category"], 0.0) + float(e["amount"])
+    return len(listed), len(in_month), by_month, by_category
+
+
+def record_round(expenses, month):
+    listed = [
+        f"£{e.amount:.2f} - {e.category} - {e.description} - {e.display_time}"
+        for e in sorted(expenses, key=lambda e: e.timestamp, reverse=True)
+    ]
+    in_month = [e for e in expenses if e.month == month]
+    by_month, by_category = {}, {}
+    for e in expenses:
+        by_month[e.month] = by_month.get(e.month, 0.0) + e.amount
+        by_category[e.category] = by_category.get(e.category, 0.0) + e.amount
+    return len(listed), len(in_month), by_month, by_category
+
+
+def timed(fn, *args):
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "expenses.json")
+        make_file(path, args.records)
+
+        with open(path) as file:
+            dicts, dict_load = timed(json.load, file)
+        records, record_load = timed(lambda: [Expense.from_dict(d) for d in dicts])
+        month = records[0].month
+
+        print(f"{args.records:,} records")
+        print(f"load (json):              {dict_load:8.2f} s")
+        print(f"  + build records:        {record_load:8.2f} s")
+
+        dict_total = record_total = 0.0
+        for n in range(1, args.rounds + 1):
+            dict_result, dict_time = timed(dict_round, dicts, month)
+            record_result, record_time = timed(record_round, records, month)
+            dict_total += dict_time
+            record_total += record_time
+            print(f"round {n}: dicts {dict_time:6.2f} s   records {record_time:6.2f} s")
+
+            assert dict_result[:2] == record_result[:2]
+            assert dict_result[3].keys() == record_result[3].keys()
+
+        print(f"total incl. record build: dicts {dict_total:6.2f} s   records {record_total + record_load:6.2f} s "
+              f"({dict_total / (record_total + record_load):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
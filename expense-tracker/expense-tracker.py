@@ -1,41 +1,19 @@
 from datetime import datetime, timezone
-import json
-import os
+import sys
 import uuid
 
-# HELPERS
-# Function to load from a .json file.
-def load_expenses(filename="expenses.json"):
-    if not os.path.exists(filename):
-        with open(filename, "w") as file:
-            json.dump([], file)
-        return []
-
-    with open(filename, "r") as file:
-        content = file.read().strip()
-        if not content:
-            return []
+from ledger import SqliteLedger, StreamLedger, migrate_json_to_sqlite, open_ledger, open_snapshot_ledger
+from records import Expense
+from storage import LedgerFileError
 
-        try:
-            data = json.loads(content)
-            if isinstance(data, list):
-                return data
-            return []
-        except json.JSONDecodeError:
-            return []
-# Save to said .json file.
-def save_expenses(expenses, filename="expenses.json"):
-    with open(filename, "w") as file:
-        json.dump(expenses, file, indent=4)
-
-# Formating the time stamp to look more user friendly.
-def format_timestamp(ts: str) -> str:
-    try:
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        local_dt = dt.astimezone()
-        return local_dt.strftime("%d-%m-%Y %H:%M")
-    except Exception:
-        return ts
+# HELPERS
+# Open the ledger picked by EXPENSE_STORAGE: journal (default), json or sqlite.
+# With stream=True the file is read afresh for each view instead of held in memory.
+def load_expenses(stream=False):
+    return open_ledger("expenses.json", stream=stream)
+# Rewrite everything in one go (also compacts the journal).
+def save_expenses(expenses):
+    expenses.save()
 
 # Safer code for validating inputs.
 def get_valid_amount():
@@ -82,41 +60,18 @@ def get_optional_amount(prompt: str):
 def normalise_amounts(expenses):
     changed = False
     for e in expenses:
-        try:
-            e["amount"] = round(float(e["amount"]), 2)
+        amount = round(e.amount, 2)
+        if amount != e.amount:
+            e.amount = amount
             changed = True
-        except (KeyError, ValueError, TypeError):
-            pass
     if changed:
         save_expenses(expenses)
 
-# ID helpers
-def find_expense_index_by_id(expenses, expense_id: str):
-    expense_id = expense_id.strip().lower()
-    for i, e in enumerate(expenses):
-        if str(e.get("id", "")).lower().startswith(expense_id):
-            return i
-    return None
-def find_expense_index_by_id_prefix(expenses, user_input: str):
-    prefix = user_input.strip().lower()
-    if not prefix:
-        return None
-
-    matches = []
-    for i, e in enumerate(expenses):
-        exp_id = str(e.get("id", "")).lower()
-        if exp_id.startswith(prefix):
-            matches.append(i)
-
-    if len(matches) == 1:
-        return matches[0]
-
-    return None
 def ensure_expense_ids(expenses):
     changed = False
     for e in expenses:
-        if isinstance(e, dict) and not e.get("id"):
-            e["id"] = str(uuid.uuid4())
+        if not e.id:
+            e.id = str(uuid.uuid4())
             changed = True
     if changed:
         save_expenses(expenses)
@@ -126,36 +81,33 @@ def add_expense(expenses):
     amount = get_valid_amount()
     category = get_non_empty_input("Enter category: ")
     description = get_non_empty_input("Enter description: ")
-    expense = {
-        "id": str(uuid.uuid4()),
-        "amount": amount,
-        "category": category,
-        "description": description,
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-
-    expenses.append(expense)
-    save_expenses(expenses)
+    expense = Expense(
+        id=str(uuid.uuid4()),
+        amount=amount,
+        category=category,
+        description=description,
+        timestamp=datetime.now(timezone.utc).isoformat(),
+    )
+
+    expenses.add(expense)
     print("Expenses have been added.\n")
 
 # This is a render function to not duplicate data.
-def display_expenses(expense_list):
+def display_expenses(expense_list, short_id=None):
     if not expense_list:
         print("No expenses recorded.\n")
         return
     
     for i, expense in enumerate(expense_list, start=1):
-        ts = format_timestamp(expense.get("timestamp", ""))
-        short_id = str(expense.get("id", ""))[:8]
-        amount = float(expense.get("amount", 0))
-        print(f"{i}, [{short_id}] £{amount:.2f} - {expense.get('category', '')} - {expense.get('description', '')} - {ts}")
+        # Amount, parsed time and the display string were all worked out at load.
+        shown_id = short_id(expense) if short_id else expense.id[:8]
+        print(f"{i}, [{shown_id}] £{expense.amount:.2f} - {expense.category} - {expense.description} - {expense.display_time}")
     
     print()
 
 # This function is the default show all, newest first.
 def view_expenses(expenses):
-    sorted_list = sorted(expenses, key=lambda e: e.get("timestamp", ""), reverse=True)
-    display_expenses(sorted_list)
+    display_expenses(expenses.newest_first(), expenses.short_id)
 
 def filter_by_category(expenses):
     if not expenses:
@@ -164,12 +116,10 @@ def filter_by_category(expenses):
     
     category = get_non_empty_input("Enter cetegory to filter by: ").strip()
 
-    filtered = [e for e in expenses if str(e.get("category", "")).strip().lower() == category.lower()]
-    
-    filtered = sorted(filtered, key=lambda e: e.get("timestamp", ""), reverse=True)
+    filtered = expenses.by_category(category)
 
     print(f"\nExpenses in category: {category}")
-    display_expenses(filtered)
+    display_expenses(filtered, expenses.short_id)
 
 def filter_by_month(expenses):
     if not expenses:
@@ -177,22 +127,22 @@ def filter_by_month(expenses):
         
     month = get_non_empty_input("Enter month (YYYY-MM), e.g. 2026-01: ").strip()
 
-    filtered = []
-    for e in expenses:
-        ts = e.get("timestamp", "")
-        if not ts:
-            continue
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            month_key = dt.strftime("%Y-%m")
-            if month_key == month:
-                filtered.append(e)
-        except ValueError:
-            continue
-    filtered = sorted(filtered, key=lambda e: e.get("timestamp", ""), reverse=True)
+    filtered = expenses.by_month(month)
 
     print(f"\nExpenses in month: {month}")
-    display_expenses(filtered)
+    display_expenses(filtered, expenses.short_id)
+
+def search_expenses(expenses):
+    if not expenses:
+        print("No expenses recorded.\n")
+        return
+
+    text = get_non_empty_input("Search for (words or the start of them): ").strip()
+
+    found = expenses.search(text)
+
+    print(f"\nBest matches for: {text}")
+    display_expenses(found, expenses.short_id)
 
 # sub-menu function
 def filter_menu(expenses):
@@ -222,17 +172,8 @@ def category_totals(expenses):
     if not expenses:
         print("No expenses recorded.\n")
         return
-    totals = {}
+    totals = expenses.category_totals()
 
-    for expense in expenses:
-        category = expense["category"]
-        amount = float(expense["amount"])
-
-        if category not in totals:
-            totals[category] = 0.0
-    
-        totals[category] += amount
-    
     print("\nSpending by Category:")
     for category, total in totals.items():
         print(f"{category}: £{total:.2f}")
@@ -245,59 +186,79 @@ def monthly_totals(expenses):
         print("No expenses recorded.\n")
         return
     
-    totals = {}
+    totals = expenses.monthly_totals()
 
-    for expense in expenses:
-        ts = expense.get("timestamp")
-        if not ts:
-            continue
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        except ValueError:
-            continue
+    print("\nSpending by Month:")
+    for month, total in totals.items():
+        print(f"{month}: £{total:.2f}")
+
+    print()
 
-        month_key = dt.strftime("%Y-%m")
+# Counts, averages and trends per category and per month (needs numpy).
+def show_statistics(expenses):
+    if not expenses:
+        print("No expenses recorded.\n")
+        return
 
-        amount = float(expense["amount"])
+    stats = expenses.stats()
+    if stats is None:
+        print("Statistics need numpy (pip install numpy).\n")
+        return
 
-        if month_key not in totals:
-            totals[month_key] = 0.0
-        
-        totals[month_key] += amount
-    
-    print("\nSpending by Month:")
-    for month, total in sorted(totals.items()):
-        print(f"{month}: £{total:.2f}")
+    print(f"\n{stats['count']} expenses, £{stats['total']:.2f} in total.")
+    print("\nBy Category:            count     total      mean    median       p90")
+    for row in stats["by_category"]:
+        print(f"{row['category'][:20]:<20} {row['count']:>8} {row['sum']:>9.2f} {row['mean']:>9.2f} "
+              f"{row['median']:>9.2f} {row['p90']:>9.2f}")
+
+    print("\nBy Month:     total    change   3-month avg  12-month avg")
+    for row in stats["by_month"]:
+        change = "" if row["delta"] is None else f"{row['delta']:+.2f}"
+        avg_3 = "" if row["rolling_3"] is None else f"{row['rolling_3']:.2f}"
+        avg_12 = "" if row["rolling_12"] is None else f"{row['rolling_12']:.2f}"
+        print(f"{row['month']}  {row['sum']:>9.2f} {change:>9} {avg_3:>13} {avg_12:>13}")
 
     print()
 
+# Shows the latest few, asks for an ID (or any unique start of one) and looks it up.
+RECENT_COUNT = 10
+
+def pick_expense(expenses, action: str):
+    print(f"Latest {RECENT_COUNT} expenses (option 2 lists them all):")
+    display_expenses(expenses.latest(RECENT_COUNT), expenses.short_id)
+    user_id = input(f"Enter expense ID (as shown in []) to {action}: ").strip()
+
+    expense, candidates = expenses.resolve(user_id)
+    if expense is None:
+        if candidates:
+            print("That ID matches more than one expense:")
+            display_expenses(candidates, expenses.short_id)
+            print("Type a few more characters of the ID.\n")
+        else:
+            print("No matching ID found. Copy the ID shown in [].\n")
+    return expense
+
 # This function is to delete expenses using their IDs.
 def delete_expense_by_id(expenses):
     if not expenses:
         print("No expenses to delete.\n")
         return
 
-    view_expenses(expenses)
-    user_id = input("Enter expense ID (or first 8 chars) to delete: ").strip()
-
-    idx = find_expense_index_by_id_prefix(expenses, user_id)
-
-    if idx is None:
-        print("No matching ID found (or ID was ambiguous). Copy the 8-char ID shown in [].\n")
+    e = pick_expense(expenses, "delete")
+    if e is None:
         return
 
-    e = expenses[idx]
     confirm = input(
-        f"Delete [{str(e.get('id',''))[:8]}] £{float(e['amount']):.2f} - {e['category']} - {e['description']}? (Y/N): "
+        f"Delete [{expenses.short_id(e)}] £{e.amount:.2f} - {e.category} - {e.description}? (Y/N): "
     ).strip().upper()
 
     if confirm != "Y":
         print("Deletion cancelled.\n")
         return
 
-    removed = expenses.pop(idx)
-    save_expenses(expenses)
-    print(f"Deleted [{str(removed.get('id',''))[:8]}].\n")
+    shown_id = expenses.short_id(e)
+    expenses.delete(e)
+    print(f"Deleted [{shown_id}].\n")
 
     
 
@@ -308,23 +269,15 @@ def edit_expense_by_id(expenses):
         print("No expenses to edit.\n")
         return
     
-    view_expenses(expenses)
-    user_id = input("Enter expense ID (or first 8 chars) to delete: ").strip()
-
-    idx = find_expense_index_by_id_prefix(expenses, user_id)
-
-    if idx is None:
-        print("No matching ID found (or ID was ambiguous). Copy the 8-char ID shown in [].\n")
+    expense = pick_expense(expenses, "edit")
+    if expense is None:
         return
-    
-    expense = expenses[idx]
 
     print("\nPress Enter to keep the current value.\n")
 
-    current_amount = float(expense.get("amount", 0))
-    new_amount = get_optional_amount(f"Amount (current £{current_amount:.2f}): ")
-    new_category = get_optional_input(f"Category (current {expense.get('category','')}): ")
-    new_description = get_optional_input(f"Description (current {expense.get('description','')}): ")
+    new_amount = get_optional_amount(f"Amount (current £{expense.amount:.2f}): ")
+    new_category = get_optional_input(f"Category (current {expense.category}): ")
+    new_description = get_optional_input(f"Description (current {expense.description}): ")
 
     if new_amount is None and new_category is None and new_description is None:
         print('No changes made.\n')
@@ -332,28 +285,68 @@ def edit_expense_by_id(expenses):
     confirm = input("Do you wish to save changes? (Y/N): ").strip().upper()
     if confirm != "Y":
         print("Edit cancelled.\n")
+        return
 
     if new_amount is not None:
-        expense["amount"] = new_amount
+        expense.amount = new_amount
     if new_category is not None:
-        expense["category"] = new_category
+        expense.category = new_category
     if new_description is not None:
-        expense["description"] = new_description
+        expense.description = new_description
 
-    expense["timestampt"] = datetime.now(timezone.utc).isoformat()
+    expense.extra["timestampt"] = datetime.now(timezone.utc).isoformat()
 
-    save_expenses(expenses)
-    print(f"Expense updated [{str(expense.get('id', ''))[:8]}].\n")
+    expenses.update(expense)
+    print(f"Expense updated [{expenses.short_id(expense)}].\n")
 # Shows the total amount of expenses
 def total_expenses(expenses):
-    total = sum(expense["amount"] for expense in expenses )
+    total = expenses.total()
     print(f"Total spent: £{total:.2f}\n")
 
+# Tells the user about records the loader had to skip (they are kept in the backup file).
+SKIPPED_SHOWN = 10
+
+def report_skipped(storage):
+    skipped = getattr(storage, "skipped", [])
+    if not skipped:
+        return
+    print(f"Skipped {len(skipped)} bad record(s) in {storage.filename}:")
+    for position, reason in skipped[:SKIPPED_SHOWN]:
+        print(f"  record {position + 1}: {reason}")
+    if len(skipped) > SKIPPED_SHOWN:
+        print(f"  ... and {len(skipped) - SKIPPED_SHOWN} more")
+    print(f"The original file was copied to {storage.backup}.\n")
+
 # main function loop
 def main():
-    expenses = load_expenses()
-    ensure_expense_ids(expenses)
-    normalise_amounts(expenses)
+    if "--migrate-to-sqlite" in sys.argv[1:]:
+        report = migrate_json_to_sqlite("expenses.json")
+        print(f"Copied {report.inserted} expenses into expenses.db ({report.failed} skipped).")
+        print("Run with EXPENSE_STORAGE=sqlite to use it.")
+        return
+
+    stream = "--stream" in sys.argv[1:]
+    try:
+        if "--snapshot" in sys.argv[1:]:
+            expenses = open_snapshot_ledger("expenses.json")
+            if expenses is None:
+                print("--snapshot needs numpy (pip install numpy).")
+                return
+            print(f"{len(expenses)} expenses from the snapshot (read-only: add, delete and update are off).\n")
+        else:
+            expenses = load_expenses(stream)
+            if isinstance(expenses, StreamLedger):
+                # One pass up front so bad records are reported before anything is shown.
+                print(f"{len(expenses)} expenses in {expenses.storage.filename} (streamed).\n")
+            elif not isinstance(expenses, SqliteLedger):
+                # The bulk fix-ups rewrite everything, so they are left out when streaming.
+                # expenses.db needs neither: rows have integer ids, and its save() writes nothing.
+                ensure_expense_ids(expenses)
+                normalise_amounts(expenses)
+    except LedgerFileError as e:
+        print(f"Can't read expenses.json: {e}. Nothing was changed; fix or move the file and try again.")
+        return
+    report_skipped(getattr(expenses, "storage", None))
 
     while True:
         print("Expense Tracker")
@@ -365,7 +358,9 @@ def main():
         print("6. Category totals")
         print("7. Monthly totals")
         print("8. Filter")
-        print("9. Exit")
+        print("9. Search")
+        print("10. Statistics")
+        print("11. Exit")
 
         try:
             choice = int(input("Choose an option: "))
@@ -373,7 +368,9 @@ def main():
             print("Please enter a number.\n")
             continue
 
-        if choice == 1:
+        if choice in (1, 4, 5) and getattr(expenses, "read_only", False):
+            print("The snapshot is read-only; run without --snapshot to make changes.\n")
+        elif choice == 1:
             add_expense(expenses)
         elif choice == 2:
             view_expenses(expenses)
@@ -390,6 +387,10 @@ def main():
         elif choice == 8:
             filter_menu(expenses)
         elif choice == 9:
+            search_expenses(expenses)
+        elif choice == 10:
+            show_statistics(expenses)
+        elif choice == 11:
             print("Goodbye!")
             break
         else:
@@ -0,0 +1,87 @@
+from bisect import bisect_left, insort
+
+# Sorts after every character an id can contain, so prefix + END bounds a prefix range.
+END = "\U0010ffff"
+
+
+class IdPrefixIndex:
+    """
+    Expense ids kept in a sorted list so prefixes resolve with bisect.
+
+    Every id that starts with a prefix sits in one contiguous run of the sorted
+    list, so finding them is two binary searches: O(log N) instead of lowercasing
+    and comparing every id. Add and delete keep the list sorted with insort/del.
+    """
+
+    def __init__(self, expenses=()):
+        self._by_key = {}
+        for e in expenses:
+            key = _key(e)
+            if key:
+                self._by_key[key] = e
+        self._keys = sorted(self._by_key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, expense):
+        key = _key(expense)
+        if not key:
+            return
+        if key not in self._by_key:
+            insort(self._keys, key)
+        self._by_key[key] = expense
+
+    def remove(self, expense):
+        key = _key(expense)
+        if self._by_key.pop(key, None) is None:
+            return
+        i = bisect_left(self._keys, key)
+        del self._keys[i]
+
+    def _range(self, prefix):
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + END)
+
+    def resolve(self, user_input: str, max_candidates=10):
+        """
+        Find the expense whose id starts with user_input.
+
+        Returns:
+            expense (Expense | None): the match, if exactly one id matches (or one matches exactly)
+            candidates (list): up to max_candidates matching expenses when the prefix is ambiguous
+        """
+        prefix = user_input.strip().lower()
+        if not prefix:
+            return None, []
+
+        lo, hi = self._range(prefix)
+        if hi - lo == 1 or (hi > lo and self._keys[lo] == prefix):
+            return self._by_key[self._keys[lo]], []
+        return None, [self._by_key[k] for k in self._keys[lo:min(hi, lo + max_candidates)]]
+
+    def short_id(self, expense, min_len=4):
+        """The shortest prefix (at least min_len chars) that only this expense's id starts with."""
+        key = _key(expense)
+        i = bisect_left(self._keys, key)
+        if i >= len(self._keys) or self._keys[i] != key:
+            return expense.id[:8]
+
+        # Only the neighbours in sorted order can share a longer prefix with key.
+        longest = 0
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(self._keys):
+                longest = max(longest, _common_prefix_len(key, self._keys[j]))
+        return expense.id[:max(min_len, longest + 1)]
+
+
+def _key(expense):
+    return expense.id.lower()
+
+
+def _common_prefix_len(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
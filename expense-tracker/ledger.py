@@ -0,0 +1,674 @@
+import heapq
+import os
+import sys
+from contextlib import closing
+from pathlib import Path
+
+from id_index import IdPrefixIndex
+from records import Expense
+from search_index import SearchIndex, stream_search
+from storage import get_storage
+from timeline import Timeline
+
+# The web app lives next door; the SQLite ledger reuses its schema and db helpers,
+# and both ledgers use its analytics module for the totals and statistics.
+WEB_APP_DIR = Path(__file__).resolve().parent.parent / "expense-tracker-web"
+
+
+def _use_web_app():
+    if str(WEB_APP_DIR) not in sys.path:
+        sys.path.insert(0, str(WEB_APP_DIR))
+
+
+def load_snapshot_module():
+    """The web app's snapshot module, or None if numpy isn't installed."""
+    _use_web_app()
+    try:
+        import snapshot
+    except ImportError:
+        return None
+    return snapshot
+
+
+def load_analytics():
+    """The web app's numpy analytics module, or None if numpy isn't installed."""
+    _use_web_app()
+    try:
+        import analytics
+    except ImportError:
+        return None
+    return analytics
+
+def sum_by_category(expenses):
+    """{category: total} in one pass over any iterable of expenses."""
+    totals = {}
+    for expense in expenses:
+        category = expense.category
+        totals[category] = totals.get(category, 0.0) + expense.amount
+    return totals
+
+
+def sum_by_month(expenses):
+    """{"YYYY-MM": total} in month order, in one pass; undated expenses are left out."""
+    totals = {}
+    for expense in expenses:
+        month = expense.month
+        if month is None:
+            continue
+        totals[month] = totals.get(month, 0.0) + expense.amount
+    return dict(sorted(totals.items()))
+
+# A ledger is what the CLI menu works against. All kinds answer the same calls:
+#   len(ledger), iter(ledger)            -> Expense records (see records.py)
+#   add / update / delete(expense)
+#   find(id_or_prefix)                   -> Expense or None
+#   resolve(id_or_prefix)                -> (expense or None, ambiguous candidates)
+#   short_id(expense)                    -> the id as shown in lists
+#   newest_first(), latest(n), by_category(name), by_month("YYYY-MM")
+#   search(text, limit)                  -> best matches for the words in text (prefixes ok)
+#   category_totals(), monthly_totals(), total()
+#   stats()                              -> analytics.summarize() output, or None without numpy
+#   save()                               -> persist everything (after bulk fix-ups)
+
+
+class ListLedger:
+    """Everything in memory as Expense records in file order, persisted by a file backend (see storage.py)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        # Parse every timestamp and amount once here; the views below only read fields.
+        # Keyed by object identity, so a delete doesn't have to search for its expense.
+        self.expenses = {}
+        for data in storage.load():
+            if isinstance(data, dict):
+                expense = Expense.from_dict(data)
+                self.expenses[id(expense)] = expense
+        self._build_indexes()
+
+    def _build_indexes(self):
+        # Everything newest-first is served from these, kept in order as expenses
+        # change: the whole ledger, and one timeline per category and per month.
+        self.ids = IdPrefixIndex(self)
+        self.timeline = Timeline(self)
+        self.categories = {}
+        self.months = {}
+        # Where each expense is filed (by object identity), so an edit can move it.
+        self._placed = {}
+        # Columnar copy for analytics and the search index, built on first use after each change.
+        self._columns = None
+        self._search = None
+        for expense in self:
+            self._file(expense)
+
+    @staticmethod
+    def _category_key(category):
+        return category.strip().lower()
+
+    def _file(self, expense):
+        placed = (expense.timestamp, self._category_key(expense.category), expense.month)
+        self._placed[id(expense)] = placed
+        self.categories.setdefault(placed[1], Timeline()).add(expense)
+        if placed[2] is not None:
+            self.months.setdefault(placed[2], Timeline()).add(expense)
+
+    def _unfile(self, expense):
+        timestamp, category, month = self._placed.pop(id(expense))
+        for index, key in ((self.categories, category), (self.months, month)):
+            timeline = index.get(key)
+            if timeline is None:
+                continue
+            timeline.remove(expense, timestamp)
+            if not timeline:
+                del index[key]
+
+    def __len__(self):
+        return len(self.expenses)
+
+    def __iter__(self):
+        return iter(self.expenses.values())
+
+    def save(self):
+        # Bulk fix-ups (e.g. ensure_expense_ids) may have changed ids behind the indexes' back.
+        self._build_indexes()
+        self.storage.save(self)
+
+    def add(self, expense):
+        self.expenses[id(expense)] = expense
+        self.ids.add(expense)
+        self.timeline.add(expense)
+        self._file(expense)
+        self._columns = None
+        self._search = None
+        self.storage.added(self, expense)
+
+    def update(self, expense):
+        timestamp = self._placed[id(expense)][0]
+        self._unfile(expense)
+        self._file(expense)
+        if expense.timestamp != timestamp:
+            self.timeline.remove(expense, timestamp)
+            self.timeline.add(expense)
+        self._columns = None
+        self._search = None
+        self.storage.updated(self, expense)
+
+    def delete(self, expense):
+        del self.expenses[id(expense)]
+        self.ids.remove(expense)
+        self.timeline.remove(expense)
+        self._unfile(expense)
+        self._columns = None
+        self._search = None
+        self.storage.deleted(self, expense)
+
+    def find(self, user_input: str):
+        return self.ids.resolve(user_input)[0]
+
+    def resolve(self, user_input: str):
+        return self.ids.resolve(user_input)
+
+    def short_id(self, expense):
+        return self.ids.short_id(expense)
+
+    def newest_first(self):
+        return self.timeline.newest()
+
+    def latest(self, n: int):
+        return self.timeline.newest(n)
+
+    def by_category(self, category: str):
+        timeline = self.categories.get(self._category_key(category))
+        return timeline.newest() if timeline else []
+
+    def by_month(self, month: str):
+        timeline = self.months.get(month)
+        return timeline.newest() if timeline else []
+
+    def search(self, text: str, limit: int = 50):
+        if self._search is None:
+            self._search = SearchIndex(self)
+        return self._search.search(text, limit)
+
+    def columns(self, analytics):
+        if self._columns is None:
+            self._columns = analytics.ExpenseColumns.from_rows(
+                (e.amount, e.category, e.month) for e in self
+            )
+        return self._columns
+
+    def stats(self):
+        analytics = load_analytics()
+        if analytics is None:
+            return None
+        return analytics.summarize(self.columns(analytics))
+
+    # The totals use the numpy columns when they can and plain loops otherwise.
+
+    def category_totals(self):
+        analytics = load_analytics()
+        if analytics is not None:
+            return {r["category"]: r["sum"] for r in analytics.by_category(self.columns(analytics))}
+
+        return sum_by_category(self)
+
+    def monthly_totals(self):
+        analytics = load_analytics()
+        if analytics is not None:
+            return {r["month"]: r["sum"] for r in analytics.by_month(self.columns(analytics)) if r["count"]}
+
+        return sum_by_month(self)
+
+    def total(self):
+        analytics = load_analytics()
+        if analytics is not None:
+            return float(self.columns(analytics).amounts.sum())
+        return sum(expense.amount for expense in self)
+
+
+class StreamLedger:
+    """
+    A file ledger that is never loaded: every view streams the file again (see JsonStorage.iter_records).
+
+    Memory stays bounded by what a view returns, not by the size of the
+    history, at the cost of a read of the file per view. Changes go through
+    the storage as usual; a full rewrite streams the old file into the new one.
+    """
+
+    # How many expenses "view all" shows; the whole history may not fit on screen or in memory.
+    VIEW_LIMIT = 1000
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __iter__(self):
+        for data in self.storage.iter_records():
+            yield Expense.from_dict(data)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        records = iter(self)
+        try:
+            return next(records, None) is not None
+        finally:
+            records.close()
+
+    def save(self):
+        self.storage.save(self)
+
+    # The storage is handed the ledger as it is after the change, streamed. It is
+    # matched by id, so it is right whether or not the journal already has the event.
+
+    def add(self, expense):
+        self.storage.added(self._changed(expense), expense)
+
+    def update(self, expense):
+        self.storage.updated(self._changed(expense), expense)
+
+    def delete(self, expense):
+        self.storage.deleted(self._changed(expense, keep=False), expense)
+
+    def _changed(self, expense, keep=True):
+        """Every expense, with this one in place of the one sharing its id (or at the end if new, or gone if not keep)."""
+        placed = False
+        for e in self:
+            if e.id == expense.id:
+                if keep and not placed:
+                    placed = True
+                    yield expense
+                continue
+            yield e
+        if keep and not placed:
+            yield expense
+
+    def find(self, user_input: str):
+        return self.resolve(user_input)[0]
+
+    def resolve(self, user_input: str):
+        user_input = user_input.strip()
+        if not user_input:
+            return None, []
+        candidates = []
+        for expense in self:
+            if expense.id == user_input:
+                return expense, []
+            if expense.id.startswith(user_input) and len(candidates) < 10:
+                candidates.append(expense)
+        if len(candidates) == 1:
+            return candidates[0], []
+        return None, candidates
+
+    def short_id(self, expense):
+        return expense.id[:8]
+
+    def newest_first(self):
+        return self.latest(self.VIEW_LIMIT)
+
+    def latest(self, n: int):
+        return heapq.nlargest(n, self, key=lambda e: e.timestamp or "")
+
+    def by_category(self, category: str):
+        key = category.strip().lower()
+        found = [e for e in self if e.category.strip().lower() == key]
+        return sorted(found, key=lambda e: e.timestamp or "", reverse=True)
+
+    def by_month(self, month: str):
+        found = [e for e in self if e.month == month]
+        return sorted(found, key=lambda e: e.timestamp or "", reverse=True)
+
+    def search(self, text: str, limit: int = 50):
+        return stream_search(self.__iter__, text, limit)
+
+    def category_totals(self):
+        return sum_by_category(self)
+
+    def monthly_totals(self):
+        return sum_by_month(self)
+
+    def total(self):
+        return sum(expense.amount for expense in self)
+
+    def stats(self):
+        analytics = load_analytics()
+        if analytics is None:
+            return None
+        # Three numbers a row, not the Expense records themselves.
+        return analytics.summarize(
+            analytics.ExpenseColumns.from_rows((e.amount, e.category, e.month) for e in self)
+        )
+
+
+class ReadOnlyLedger(Exception):
+    """Raised by changes to a ledger that is only a snapshot."""
+
+
+class SnapshotLedger:
+    """
+    The read-only views over a snapshot file (see snapshot.py in the web app).
+
+    The columns are mmap'ed NumPy arrays, so opening takes milliseconds at any
+    size and the views are array operations; Expense records are only built
+    for the rows a view returns. Changes raise ReadOnlyLedger.
+    """
+
+    read_only = True
+    VIEW_LIMIT = StreamLedger.VIEW_LIMIT
+
+    def __init__(self, snap):
+        import numpy as np
+
+        self.np = np
+        self.snap = snap
+        self.timestamps = snap.array("timestamps")
+        self.categories = snap.array("categories")
+        self.months = snap.array("months")
+
+    def _expense(self, i):
+        expense_id, amount, category, description, timestamp = self.snap.row(int(i))
+        return Expense(id=expense_id, amount=amount, category=category, description=description, timestamp=timestamp)
+
+    def _newest(self, rows, limit=None):
+        """Expenses at the row numbers in rows, newest first (by timestamp, then latest written)."""
+        np = self.np
+        rows = np.asarray(rows)
+        if limit is not None and limit < len(rows):
+            # Only the newest `limit` need sorting.
+            rows = rows[np.argpartition(self.timestamps[rows], len(rows) - limit)[len(rows) - limit:]]
+        order = np.lexsort((rows, self.timestamps[rows]))[::-1]
+        return [self._expense(i) for i in rows[order]]
+
+    def __len__(self):
+        return len(self.snap)
+
+    def __iter__(self):
+        for i in range(len(self.snap)):
+            yield self._expense(i)
+
+    def save(self):
+        raise ReadOnlyLedger
+
+    def add(self, expense):
+        raise ReadOnlyLedger
+
+    def update(self, expense):
+        raise ReadOnlyLedger
+
+    def delete(self, expense):
+        raise ReadOnlyLedger
+
+    def find(self, user_input: str):
+        return self.resolve(user_input)[0]
+
+    def resolve(self, user_input: str):
+        user_input = user_input.strip()
+        if not user_input:
+            return None, []
+        ids = self.snap.array("ids")
+        wanted = user_input.encode("utf-8")
+        exact = self.np.flatnonzero(ids == wanted)
+        if len(exact):
+            return self._expense(exact[0]), []
+        matches = self.np.flatnonzero(self.np.char.startswith(ids, wanted))
+        if len(matches) == 1:
+            return self._expense(matches[0]), []
+        return None, [self._expense(i) for i in matches[:10]]
+
+    def short_id(self, expense):
+        return expense.id[:8]
+
+    def newest_first(self):
+        return self.latest(self.VIEW_LIMIT)
+
+    def latest(self, n: int):
+        return self._newest(self.np.arange(len(self.snap)), n)
+
+    def by_category(self, category: str):
+        key = category.strip().lower()
+        codes = [code for code, name in enumerate(self.snap.category_names) if name.strip().lower() == key]
+        return self._newest(self.np.flatnonzero(self.np.isin(self.categories, codes)))
+
+    def by_month(self, month: str):
+        analytics = load_analytics()
+        try:
+            ordinal = analytics.month_ordinal(month)
+        except ValueError:
+            return []
+        return self._newest(self.np.flatnonzero(self.months == ordinal))
+
+    def search(self, text: str, limit: int = 50):
+        return stream_search(self.__iter__, text, limit)
+
+    def category_totals(self):
+        return {r["category"]: r["sum"] for r in load_analytics().by_category(self.snap.columns())}
+
+    def monthly_totals(self):
+        return {r["month"]: r["sum"] for r in load_analytics().by_month(self.snap.columns()) if r["count"]}
+
+    def total(self):
+        return float(self.snap.array("amounts").sum())
+
+    def stats(self):
+        return load_analytics().summarize(self.snap.columns())
+
+
+class SqliteLedger:
+    """
+    The web app's expenses.db, queried directly instead of loaded into memory.
+
+    Filters run on the (category, created_at) and (month, created_at) indexes and
+    the totals come from expense_rollup, so nothing here needs the whole table.
+    IDs are the table's integer ids, and `timestamp` is the stored created_at
+    (naive local time, which Expense.display_time already shows as local).
+    """
+
+    VIEW_LIMIT = StreamLedger.VIEW_LIMIT
+
+    def __init__(self):
+        _use_web_app()
+        import db
+
+        db.init_db()
+        self.conn = db.get_conn()
+
+    @staticmethod
+    def _to_expense(row):
+        return Expense(
+            id=str(row["id"]),
+            amount=row["amount"],
+            category=row["category"],
+            description=row["description"],
+            timestamp=row["created_at"],
+        )
+
+    def _select(self, where_sql="", params=(), limit=-1):
+        rows = self.conn.execute(
+            "SELECT id, amount, category, description, created_at FROM expenses"
+            + where_sql + " ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit),
+        )
+        return [self._to_expense(r) for r in rows]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COALESCE(SUM(count), 0) FROM expense_rollup").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.conn.execute("SELECT id, amount, category, description, created_at FROM expenses"):
+            yield self._to_expense(row)
+
+    def save(self):
+        # Every change is committed as it happens.
+        pass
+
+    def add(self, expense):
+        from importer import to_row
+
+        # Same validation and UTC -> local created_at mapping as the web importer.
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO expenses (amount, category, description, created_at) VALUES (?, ?, ?, ?)",
+                to_row(expense.to_dict()),
+            )
+        expense.id = str(cur.lastrowid)
+
+    def update(self, expense):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE expenses SET amount = ?, category = ?, description = ? WHERE id = ?",
+                (expense.amount, expense.category, expense.description, int(expense.id)),
+            )
+
+    def delete(self, expense):
+        with self.conn:
+            self.conn.execute("DELETE FROM expenses WHERE id = ?", (int(expense.id),))
+
+    def find(self, user_input: str):
+        user_input = user_input.strip()
+        if not user_input.isdigit():
+            return None
+        rows = self._select(" WHERE id = ?", (int(user_input),))
+        return rows[0] if rows else None
+
+    def resolve(self, user_input: str):
+        # Integer ids are short enough to type in full, so there are no prefixes here.
+        return self.find(user_input), []
+
+    def short_id(self, expense):
+        return expense.id
+
+    def newest_first(self):
+        return self.latest(self.VIEW_LIMIT)
+
+    def latest(self, n: int):
+        return self._select(limit=n)
+
+    def by_category(self, category: str):
+        # Match case-insensitively like the file ledger, but resolve the spellings
+        # from the small rollup table first so the category index can be used.
+        names = [
+            r[0] for r in self.conn.execute(
+                "SELECT DISTINCT category FROM expense_rollup WHERE category = ? COLLATE NOCASE",
+                (category.strip(),),
+            )
+        ]
+        if not names:
+            return []
+        placeholders = ", ".join("?" for _ in names)
+        return self._select(f" WHERE category IN ({placeholders})", names)
+
+    def by_month(self, month: str):
+        return self._select(" WHERE month = ?", (month,))
+
+    def search(self, text: str, limit: int = 50):
+        # Ranked by the expenses_fts index (see search.py in the web app).
+        from search import search
+
+        return [self._to_expense(r) for r in search(self.conn, text, limit)]
+
+    def category_totals(self):
+        rows = self.conn.execute(
+            "SELECT category, SUM(total) FROM expense_rollup GROUP BY category"
+        )
+        return {category: total for category, total in rows}
+
+    def monthly_totals(self):
+        rows = self.conn.execute(
+            "SELECT month, SUM(total) FROM expense_rollup GROUP BY month ORDER BY month"
+        )
+        return {month: total for month, total in rows}
+
+    def total(self):
+        return self.conn.execute("SELECT COALESCE(SUM(total), 0) FROM expense_rollup").fetchone()[0]
+
+    def stats(self):
+        analytics = load_analytics()
+        if analytics is None:
+            return None
+        return analytics.summarize(analytics.ExpenseColumns.from_db(self.conn))
+
+
+def migrate_json_to_sqlite(filename="expenses.json"):
+    """
+    One-shot copy of the CLI's expenses (snapshot + journal) into the shared expenses.db.
+
+    Rows go through the web importer, so `timestamp` becomes `created_at` exactly
+    as it does for uploads. The JSON files are renamed afterwards so the same
+    data can't be imported twice.
+    """
+    source = ListLedger(get_storage(filename, "journal"))
+    target = SqliteLedger()
+    from importer import import_records
+
+    report = import_records(target.conn, enumerate((e.to_dict() for e in source), start=1))
+
+    for path in (filename, source.storage.journal):
+        if os.path.exists(path):
+            os.replace(path, f"{path}.migrated")
+    return report
+
+
+def write_json_snapshot(storage, path):
+    """Snapshot a json or journal file, streamed (so the snapshot can be much bigger than memory)."""
+    snapshot = load_snapshot_module()
+    stamp = snapshot.source_stamp(storage.filename, getattr(storage, "journal", ""))
+    rows = (
+        (e.get("id") or "", float(e["amount"]), str(e.get("category", "")),
+         str(e.get("description", "")), str(e.get("timestamp", "")))
+        for e in storage.iter_records()
+    )
+    return snapshot.write_snapshot(path, rows, stamp)
+
+
+def open_snapshot_ledger(filename="expenses.json", backend=None):
+    """
+    A SnapshotLedger over the ledger $EXPENSE_STORAGE picks, or None without numpy.
+
+    The snapshot sits next to its source (expenses.snapshot, or next to
+    expenses.db for sqlite) and is written again first if the source has
+    changed since.
+    """
+    snapshot = load_snapshot_module()
+    if snapshot is None:
+        return None
+    backend = backend or os.environ.get("EXPENSE_STORAGE", "journal")
+    if backend == "sqlite":
+        import db
+
+        path = db.DB_PATH.with_suffix(".snapshot")
+        # Taken before this process opens the database, which would change it.
+        stamp = snapshot.db_stamp(db.DB_PATH)
+    else:
+        storage = get_storage(filename, backend)
+        path = Path(filename).with_suffix(".snapshot")
+        stamp = snapshot.source_stamp(storage.filename, getattr(storage, "journal", ""))
+
+    try:
+        snap = snapshot.Snapshot(path)
+        if snap.is_current(stamp):
+            return SnapshotLedger(snap)
+        snap.close()
+    except (FileNotFoundError, snapshot.SnapshotError):
+        pass
+
+    if backend == "sqlite":
+        db.init_db()
+        with closing(db.connect()) as conn:
+            snapshot.write_from_db(conn, path)
+        snapshot.set_stamp(path, snapshot.db_stamp(db.DB_PATH))
+    else:
+        write_json_snapshot(storage, path)
+    return SnapshotLedger(snapshot.Snapshot(path))
+
+
+def open_ledger(filename="expenses.json", backend=None, stream=False):
+    """
+    Pick the ledger for $EXPENSE_STORAGE: json, journal (default) or sqlite.
+
+    stream=True streams a json or journal file on every view instead of loading it.
+    """
+    backend = backend or os.environ.get("EXPENSE_STORAGE", "journal")
+    if backend == "sqlite":
+        return SqliteLedger()
+    if stream:
+        return StreamLedger(get_storage(filename, backend))
+    return ListLedger(get_storage(filename, backend))
@@ -0,0 +1,87 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+KNOWN_KEYS = ("id", "amount", "category", "description", "timestamp")
+
+
+def parse_timestamp(ts: str):
+    """Returns (datetime, "YYYY-MM") for a stored ISO timestamp, or (None, None)."""
+    if not ts:
+        return None, None
+    try:
+        when = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None, None
+    # The month is read in the timestamp's own offset, so it is just the date part.
+    return when, ts[:7]
+
+
+@dataclass(slots=True)
+class Expense:
+    """
+    One expense, with everything the reports need worked out once at load time.
+
+    `when` is the parsed timestamp (UTC for the CLI's own records) and `month`
+    its "YYYY-MM" key; both are None if the timestamp can't be parsed. Keys the
+    tracker doesn't know about are kept in `extra` so saving never drops them.
+    """
+
+    id: str
+    amount: float
+    category: str
+    description: str
+    timestamp: str
+    when: datetime | None = None
+    month: str | None = None
+    extra: dict = field(default_factory=dict)
+    _display_time: str | None = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.when, self.month = parse_timestamp(self.timestamp)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        try:
+            amount = float(data.get("amount", 0))
+        except (TypeError, ValueError):
+            amount = 0.0
+        return cls(
+            id=str(data.get("id") or ""),
+            amount=amount,
+            category=str(data.get("category", "")),
+            description=str(data.get("description", "")),
+            timestamp=str(data.get("timestamp", "")),
+            extra={k: v for k, v in data.items() if k not in KNOWN_KEYS},
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "amount": self.amount,
+            "category": self.category,
+            "description": self.description,
+            "timestamp": self.timestamp,
+            **self.extra,
+        }
+
+    def set_timestamp(self, ts: str) -> None:
+        self.timestamp = ts
+        self.when, self.month = parse_timestamp(ts)
+        self._display_time = None
+
+    @property
+    def display_time(self) -> str:
+        """Local "dd-mm-YYYY HH:MM", formatted the first time it's needed and then reused."""
+        if self._display_time is None:
+            if self.when is None:
+                self._display_time = self.timestamp
+            else:
+                self._display_time = self.when.astimezone().strftime("%d-%m-%Y %H:%M")
+        return self._display_time
+
+
+def to_json(value):
+    """json.dump(default=...) hook so storage backends can write Expense records directly."""
+    if isinstance(value, Expense):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,122 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+
+TERM_RE = re.compile(r"\w+")
+
+# bm25 parameters, the same as SQLite FTS5 uses for the sqlite ledger's search.
+K1 = 1.2
+B = 0.75
+
+
+def terms(text: str) -> list[str]:
+    """Lower-cased words with accents removed, so "Café" and "cafe" match."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    return TERM_RE.findall("".join(c for c in folded if not unicodedata.combining(c)))
+
+
+class SearchIndex:
+    """
+    An inverted index over each expense's description and category.
+
+    Terms are kept sorted so a prefix ("coff") is a bisect plus a short walk
+    to every term that starts with it. Matches are ranked with bm25, the
+    same scoring FTS5 gives the sqlite ledger, and every word has to match.
+    """
+
+    def __init__(self, expenses):
+        self.expenses = list(expenses)
+        self.postings = {}  # term -> {position in self.expenses: times it appears}
+        self.lengths = []
+        for doc, expense in enumerate(self.expenses):
+            words = terms(expense.description) + terms(expense.category)
+            self.lengths.append(len(words))
+            for word in words:
+                counts = self.postings.setdefault(word, {})
+                counts[doc] = counts.get(doc, 0) + 1
+        self.terms = sorted(self.postings)
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def _matches(self, prefix: str) -> dict:
+        """{doc: count} for every term starting with prefix, merged like one FTS5 prefix phrase."""
+        merged = {}
+        i = bisect.bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            for doc, count in self.postings[self.terms[i]].items():
+                merged[doc] = merged.get(doc, 0) + count
+            i += 1
+        return merged
+
+    def search(self, text: str, limit: int = 50) -> list:
+        """The best `limit` matches for text, best first (ties newest first)."""
+        n = len(self.expenses)
+        scores = None
+        for prefix in terms(text):
+            matches = self._matches(prefix)
+            idf = max(math.log((n - len(matches) + 0.5) / (len(matches) + 0.5)), 1e-6)
+            word_scores = {}
+            for doc, count in matches.items():
+                norm = K1 * (1 - B + B * self.lengths[doc] / self.avg_length)
+                word_scores[doc] = idf * count * (K1 + 1) / (count + norm)
+
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {doc: score + word_scores[doc] for doc, score in scores.items() if doc in word_scores}
+            if not scores:
+                return []
+
+        if not scores:
+            return []
+        best = heapq.nlargest(limit, scores, key=lambda doc: (scores[doc], self.expenses[doc].timestamp or ""))
+        return [self.expenses[doc] for doc in best]
+
+
+def stream_search(open_expenses, text: str, limit: int = 50) -> list:
+    """
+    SearchIndex.search() for a ledger too big to index in memory.
+
+    open_expenses() is called twice, for two passes over the expenses: one to
+    count how many match each word (bm25 needs that), one to score them.
+    Only the best `limit` are held at any time.
+    """
+    prefixes = terms(text)
+    if not prefixes:
+        return []
+
+    def matches(expense):
+        """(words in the expense, times each prefix matched) or None if one didn't."""
+        words = terms(expense.description) + terms(expense.category)
+        counts = [sum(1 for word in words if word.startswith(p)) for p in prefixes]
+        return (len(words), counts) if all(counts) else None
+
+    n = total_length = 0
+    doc_freq = [0] * len(prefixes)
+    for expense in open_expenses():
+        words = terms(expense.description) + terms(expense.category)
+        n += 1
+        total_length += len(words)
+        for i, prefix in enumerate(prefixes):
+            if any(word.startswith(prefix) for word in words):
+                doc_freq[i] += 1
+    if not all(doc_freq):
+        return []
+
+    avg_length = total_length / n
+    idf = [max(math.log((n - df + 0.5) / (df + 0.5)), 1e-6) for df in doc_freq]
+    best = []  # heap of (score, timestamp, tie-break, expense)
+    for seq, expense in enumerate(open_expenses()):
+        found = matches(expense)
+        if found is None:
+            continue
+        length, counts = found
+        norm = K1 * (1 - B + B * length / avg_length)
+        score = sum(w * c * (K1 + 1) / (c + norm) for w, c in zip(idf, counts))
+        item = (score, expense.timestamp or "", -seq, expense)
+        if len(best) < limit:
+            heapq.heappush(best, item)
+        elif item[:3] > best[0][:3]:
+            heapq.heapreplace(best, item)
+    return [item[3] for item in sorted(best, key=lambda item: item[:3], reverse=True)]
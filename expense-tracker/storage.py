@@ -0,0 +1,371 @@
+import json
+import math
+import os
+import shutil
+import textwrap
+from datetime import datetime
+from pathlib import Path
+
+from records import to_json
+
+# Storage backends for the CLI tracker.
+#
+# Every backend has the same small interface:
+#   load()                     -> list of expense dicts (the ledger turns them into Expense records)
+#   iter_records()             -> the same dicts, streamed from disk one at a time
+#   skipped                    -> (position, reason) for each problem the last read skipped over
+#   save(expenses)             -> write every Expense record from an iterable
+#   added(expenses, expense)   -> called after expense was appended to the list
+#   updated(expenses, expense) -> called after expense was changed in place
+#   deleted(expenses, expense) -> called after expense was removed from the list
+
+
+# Characters read from the file at a time by the streaming parser.
+CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class LedgerFileError(Exception):
+    """The file isn't a JSON list at all, so nothing was loaded and it must not be overwritten."""
+
+
+class JsonStorage:
+    """The original format: the whole list in one JSON file, rewritten on every change."""
+
+    def __init__(self, filename="expenses.json"):
+        self.filename = filename
+        self.skipped = []
+        # Where the file was copied to before anything could overwrite its bad records.
+        self.backup = None
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            with open(self.filename, "w") as file:
+                json.dump([], file)
+            return []
+        return list(self.iter_records())
+
+    def iter_records(self):
+        """
+        Stream the expenses in the file, one validated dict at a time.
+
+        Only one chunk of text and one record are held at once. Records that
+        aren't valid JSON or aren't usable expenses are skipped and listed in
+        self.skipped; the first time that happens the file is copied aside, so
+        rewriting it later can't lose them.
+        """
+        self.skipped = []
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, "r") as file:
+            for position, value, problem in iter_json_array(file):
+                problem = problem or validate_record(value)
+                if problem:
+                    self.skipped.append((position, problem))
+                    self._back_up()
+                    continue
+                yield value
+
+    def _back_up(self):
+        if self.backup is None:
+            self.backup = f"{self.filename}.{datetime.now():%Y%m%d-%H%M%S}.bak"
+            shutil.copy2(self.filename, self.backup)
+
+    def save(self, expenses):
+        write_json_atomic(self.filename, expenses)
+
+    def added(self, expenses, expense):
+        self.save(expenses)
+
+    def updated(self, expenses, expense):
+        self.save(expenses)
+
+    def deleted(self, expenses, expense):
+        self.save(expenses)
+
+
+class JournalStorage(JsonStorage):
+    """
+    A JSON snapshot plus an append-only journal of changes since the snapshot.
+
+    The snapshot is the same expenses.json file JsonStorage uses, so existing
+    files work as-is. Each add/edit/delete appends one line to
+    expenses.journal.jsonl instead of rewriting the whole list. Once the journal
+    holds `compact_every` events it is folded into a fresh snapshot.
+
+    Replaying an event twice has no effect, so a crash between writing the
+    snapshot and clearing the journal loses nothing.
+    """
+
+    def __init__(self, filename="expenses.json", compact_every=500):
+        super().__init__(filename)
+        self.journal = str(Path(filename).with_suffix(".journal.jsonl"))
+        self.compact_every = compact_every
+        self.pending = 0
+        self.torn = False
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            super().load()
+        expenses = list(self.iter_records())
+        # Compact after a torn line too, so new events don't get glued onto it.
+        if self.torn or self.pending >= self.compact_every:
+            self.save(expenses)
+        return expenses
+
+    def iter_records(self):
+        """The snapshot streamed past the journal's changes (the journal is small, so it is read whole)."""
+        events, self.torn = self._read_journal()
+        self.pending = len(events)
+
+        # Replay into the last state per id; edits take an expense's place, adds go at the end.
+        changed = {}
+        deleted = set()
+        for event in events:
+            op = event.get("op")
+            if op in ("add", "edit"):
+                expense = event.get("expense", {})
+                key = _key(expense, None)
+                changed[key] = expense
+                deleted.discard(key)
+            elif op == "delete":
+                changed.pop(event.get("id"), None)
+                deleted.add(event.get("id"))
+
+        for i, expense in enumerate(super().iter_records()):
+            key = _key(expense, i)
+            if key in deleted:
+                continue
+            yield changed.pop(key, expense)
+        yield from changed.values()
+
+    def save(self, expenses):
+        """Write a fresh snapshot and start an empty journal (compaction)."""
+        super().save(expenses)
+        with open(self.journal, "w"):
+            pass
+        self.pending = 0
+
+    def added(self, expenses, expense):
+        self._append(expenses, {"op": "add", "expense": expense})
+
+    def updated(self, expenses, expense):
+        self._append(expenses, {"op": "edit", "expense": expense})
+
+    def deleted(self, expenses, expense):
+        self._append(expenses, {"op": "delete", "id": expense.id})
+
+    def _append(self, expenses, event):
+        with open(self.journal, "ab+") as file:
+            self._drop_torn_line(file)
+            file.write((json.dumps(event, default=to_json) + "\n").encode())
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.pending += 1
+        if self.pending >= self.compact_every:
+            self.save(expenses)
+
+    def _drop_torn_line(self, file):
+        """
+        Cut a torn last line off the journal before appending to it.
+
+        load() compacts one away, but a StreamLedger adds without loading, and
+        an event glued onto the torn line would be lost with it.
+        """
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            return
+        file.seek(0)
+        file.truncate(file.read().rfind(b"\n") + 1)
+        self.torn = False
+
+    def _read_journal(self):
+        """Returns (events, torn) where torn means the last line was cut short."""
+        if not os.path.exists(self.journal):
+            return [], False
+
+        events = []
+        with open(self.journal, "r") as file:
+            lines = file.read().splitlines()
+
+        for n, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn last line is what a crash mid-append looks like; anything
+                # earlier means the journal is damaged and must not be guessed at.
+                if n == len(lines):
+                    return events, True
+                raise
+        return events, False
+
+
+def _key(expense, position):
+    # Old records may not have an id yet (ensure_expense_ids() adds them after load).
+    return expense.get("id") or f"no-id-{position}"
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """
+    Parse a top-level JSON array from a text file one element at a time.
+
+    Yields (position, value, problem). problem is None for a good element;
+    otherwise value is None and problem says what is wrong there, and parsing
+    carries on from the next element. An empty file is an empty list.
+
+    Raises LedgerFileError if the file holds something other than a list.
+    """
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more() -> bool:
+        """Read another chunk, dropping what has been parsed. False at end of file."""
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = file.read(chunk_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        eof = not chunk
+        return not eof
+
+    def skip_space() -> bool:
+        """Move pos to the next non-space character. False if the file ends first."""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not more():
+                return pos < len(buf)
+
+    if not skip_space():
+        return
+    if buf[pos] != "[":
+        raise LedgerFileError("expected a list of expenses")
+    pos += 1
+
+    position = 0
+    while True:
+        if not skip_space():
+            yield position, None, "the file ends before the closing ]"
+            return
+        if buf[pos] == "]":
+            return  # the end, or a harmless trailing comma
+
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+            # A number can look complete at the end of a chunk but carry on in the next one.
+            if end == len(buf) and more():
+                continue
+            pos = end
+            yield position, value, None
+        except json.JSONDecodeError as e:
+            end = _element_end(buf, pos)
+            if end is None:
+                if more():
+                    continue  # the element is only partly read yet
+                yield position, None, "the file ends in the middle of this record"
+                return
+            yield position, None, f"not valid JSON ({e.msg})"
+            pos = end
+        position += 1
+
+        if not skip_space():
+            yield position, None, "the file ends before the closing ]"
+            return
+        if buf[pos] == "]":
+            return
+        if buf[pos] == ",":
+            pos += 1
+        else:
+            # Missing comma: report it, but the next record is read as normal.
+            yield position, None, "missing comma before this record"
+
+
+def _element_end(buf, pos):
+    """Index of the "," or "]" that ends the array element starting at pos, or None if it isn't in buf yet."""
+    depth = 0
+    in_string = escaped = False
+    for i in range(pos, len(buf)):
+        c = buf[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            if depth == 0:
+                return i
+            depth -= 1
+        elif c == "," and depth == 0:
+            return i
+    return None
+
+
+def validate_record(value):
+    """Why value can't be loaded as an expense, or None if it can."""
+    if not isinstance(value, dict):
+        return "not an expense object"
+    amount = value.get("amount")
+    if isinstance(amount, bool):
+        return "amount is not a number"
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return "amount is missing or not a number"
+    if not math.isfinite(amount) or amount < 0:
+        return "amount must be a number of 0 or more"
+    for key in ("category", "description"):
+        if not isinstance(value.get(key, ""), str):
+            return f"{key} is not text"
+    return None
+
+
+def write_json_atomic(filename, data):
+    """
+    Write to a temp file and rename it over the target, so a crash never leaves half a file.
+
+    data can be any iterable, written one record at a time in the same layout
+    as json.dump(indent=4), so a streamed ledger is saved in bounded memory.
+    """
+    tmp = f"{filename}.tmp"
+    with open(tmp, "w") as file:
+        file.write("[")
+        first = True
+        for item in data:
+            file.write("\n" if first else ",\n")
+            file.write(textwrap.indent(json.dumps(item, indent=4, default=to_json), "    "))
+            first = False
+        file.write("]" if first else "\n]")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, filename)
+
+
+BACKENDS = {
+    "json": JsonStorage,
+    "journal": JournalStorage,
+}
+
+
+def get_storage(filename="expenses.json", backend=None):
+    """Pick a backend by name, defaulting to $EXPENSE_STORAGE or the journal."""
+    backend = backend or os.environ.get("EXPENSE_STORAGE", "journal")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[backend](filename)
@@ -0,0 +1,45 @@
+from bisect import bisect_left, bisect_right
+
+
+class Timeline:
+    """
+    Expenses kept in timestamp order as they are added and removed.
+
+    Adds go in with a binary search (new expenses are usually the newest, so
+    that is an append at the end), and removes find their slot the same way.
+    Newest-first listings are then just a reversed slice, with no sort.
+    """
+
+    def __init__(self, expenses=()):
+        self._items = sorted(expenses, key=_timestamp)
+        self._keys = [e.timestamp for e in self._items]
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, expense):
+        i = bisect_right(self._keys, expense.timestamp)
+        self._keys.insert(i, expense.timestamp)
+        self._items.insert(i, expense)
+
+    def remove(self, expense, timestamp=None):
+        """Remove expense; pass the timestamp it was added with if it has changed since."""
+        key = expense.timestamp if timestamp is None else timestamp
+        lo, hi = bisect_left(self._keys, key), bisect_right(self._keys, key)
+        for i in range(lo, hi):
+            if self._items[i] is expense:
+                del self._keys[i]
+                del self._items[i]
+                return
+
+    def newest(self, n=None):
+        """The newest n expenses (all of them if n is None), newest first."""
+        if n is None:
+            return self._items[::-1]
+        if n <= 0:
+            return []
+        return self._items[:-n - 1:-1]
+
+
+def _timestamp(expense):
+    return expense.timestamp